@@ -0,0 +1,200 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from src.vector_store import VectorStoreManager as OpenAIVectorStore
+from src.vector_store_ollama import VectorStoreManager as OllamaVectorStore
+from src.rag_pipeline import RAGPipeline as OpenAIRAGPipeline
+from src.rag_pipeline_ollama import RAGPipeline as OllamaRAGPipeline
+from src.answer_cache import SemanticAnswerCache
+from src.reranker import CrossEncoderReranker
+from src.context_packer import ContextPacker
+from src.http_pool import get_http_pool
+from src.query_service import RAGService
+from src.telemetry import configure_telemetry, get_telemetry, span
+
+load_dotenv()
+
+UPLOAD_FOLDER = "uploaded_docs"
+
+
+class QueryRequest(BaseModel):
+    question: str
+    k: int = 4
+    mode: Optional[str] = None
+    filter: Optional[Dict[str, Any]] = None
+    strategy: str = os.getenv("ANSWER_STRATEGY", "sequential").lower()
+    enable_highlighting: bool = True
+    conversation_history: Optional[List[Dict[str, str]]] = None
+    retrieval_query: Optional[str] = None
+    rerank: Optional[bool] = None
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def create_answer_cache() -> Optional[SemanticAnswerCache]:
+    if not env_flag("ANSWER_CACHE", "true"):
+        return None
+    return SemanticAnswerCache(
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    )
+
+
+def create_context_packer() -> Optional[ContextPacker]:
+    budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500") or 0)
+    return ContextPacker(max_tokens=budget) if budget > 0 else None
+
+
+def index_options() -> dict:
+    nprobe = os.getenv("VECTOR_INDEX_NPROBE")
+    ef_search = os.getenv("VECTOR_INDEX_EF_SEARCH")
+    rescore_factor = os.getenv("VECTOR_RESCORE_FACTOR")
+    return {
+        "index_type": os.getenv("VECTOR_INDEX_TYPE", "flat").lower(),
+        "nprobe": int(nprobe) if nprobe else None,
+        "ef_search": int(ef_search) if ef_search else None,
+        "use_mmap": env_flag("VECTOR_STORE_MMAP", "true"),
+        "search_mode": os.getenv("RETRIEVAL_MODE", "dense").lower(),
+        "quantization": os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+        "rescore_factor": float(rescore_factor) if rescore_factor else None
+    }
+
+
+def create_service() -> RAGService:
+    provider = os.getenv("LLM_PROVIDER", "ollama").lower()
+    max_concurrency = int(os.getenv("API_LLM_CONCURRENCY", "8"))
+    if provider == "openai":
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY is required when LLM_PROVIDER=openai")
+        openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        dimensions = os.getenv("OPENAI_EMBEDDING_DIMENSIONS")
+        dimensions = int(dimensions) if dimensions else None
+        http_client = get_http_pool("openai").sync_client()
+        embeddings = OpenAIEmbeddings(openai_api_key=api_key, model=embedding_model, dimensions=dimensions, http_client=http_client)
+        manager = OpenAIVectorStore(api_key, embedding_model=embedding_model, embedding_dimensions=dimensions, embeddings=embeddings, **index_options())
+        pipeline = OpenAIRAGPipeline(
+            api_key,
+            model=openai_model,
+            embedding_model=embedding_model,
+            llm=ChatOpenAI(openai_api_key=api_key, model=openai_model, temperature=0, http_client=http_client),
+            answer_cache=create_answer_cache(),
+            max_concurrency=max_concurrency,
+            context_packer=create_context_packer()
+        )
+    else:
+        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={'device': 'cpu'})
+        manager = OllamaVectorStore(embeddings=embeddings, **index_options())
+        pipeline = OllamaRAGPipeline(
+            model=os.getenv("OLLAMA_MODEL", "qwen2.5:0.5b"),
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            embeddings=embeddings,
+            answer_cache=create_answer_cache(),
+            max_concurrency=max_concurrency,
+            context_packer=create_context_packer()
+        )
+    rerank_top_n = os.getenv("RERANK_TOP_N")
+    reranker = CrossEncoderReranker(
+        model_name=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150"))
+    )
+    service = RAGService(
+        manager,
+        pipeline,
+        provider,
+        index_name=f"vector_store_{provider}/faiss_index",
+        reranker=reranker,
+        rerank_overfetch=int(os.getenv("RERANK_OVERFETCH", "3")),
+        rerank_top_n=int(rerank_top_n) if rerank_top_n else None,
+        refresh_interval=float(os.getenv("API_REFRESH_SECONDS", "1"))
+    )
+    service.load()
+    return service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if env_flag("TELEMETRY"):
+        configure_telemetry(opentelemetry=env_flag("TELEMETRY_OTEL"), service_name="mini-rag-assistant-api")
+    app.state.service = await asyncio.to_thread(create_service)
+    yield
+
+
+app = FastAPI(title="Mini RAG Assistant API", lifespan=lifespan)
+
+
+@app.post("/query")
+async def query(request: QueryRequest) -> Dict:
+    service: RAGService = app.state.service
+    try:
+        with span("api.query", k=request.k, strategy=request.strategy):
+            return await service.query(
+                request.question,
+                k=request.k,
+                mode=request.mode,
+                metadata_filter=request.filter or None,
+                strategy=request.strategy,
+                enable_highlighting=request.enable_highlighting,
+                conversation_history=request.conversation_history,
+                retrieval_query=request.retrieval_query,
+                rerank=env_flag("RERANK") if request.rerank is None else request.rerank
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/ingest")
+async def ingest(files: List[UploadFile] = File(...)) -> Dict:
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    file_paths = []
+    for upload in files:
+        name = os.path.basename(upload.filename or "")
+        if not name.lower().endswith((".pdf", ".txt")):
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {name}")
+        file_path = os.path.join(UPLOAD_FOLDER, name)
+        with open(file_path, "wb") as f:
+            f.write(await upload.read())
+        file_paths.append(file_path)
+    return await asyncio.to_thread(app.state.service.ingest, file_paths)
+
+
+@app.get("/stats")
+async def stats() -> Dict:
+    return await asyncio.to_thread(app.state.service.get_stats)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(get_telemetry().render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/sources")
+async def sources(field: str = "source") -> Dict:
+    values = await asyncio.to_thread(app.state.service.list_values, field)
+    return {"field": field, "values": values}
+
+
+@app.get("/health")
+async def health() -> Dict:
+    return {"status": "ok"}
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "api_server:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=int(os.getenv("API_WORKERS", "2"))
+    )
@@ -1,12 +1,25 @@
 import os
+import hashlib
+import openai
 import streamlit as st
 from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_huggingface import HuggingFaceEmbeddings
 from src.document_processor import DocumentProcessor
 from src.vector_store import VectorStoreManager as OpenAIVectorStore
 from src.vector_store_ollama import VectorStoreManager as OllamaVectorStore
 from src.rag_pipeline import RAGPipeline as OpenAIRAGPipeline
 from src.rag_pipeline_ollama import RAGPipeline as OllamaRAGPipeline
 from src.auto_loader import DocumentAutoLoader
+from src.background_indexer import BackgroundIndexer
+from src.resource_registry import registry
+from src.answer_cache import SemanticAnswerCache
+from src.reranker import CrossEncoderReranker
+from src.context_packer import ContextPacker
+from src.http_pool import get_http_pool
+from src.api_client import RAGServiceClient
+from src.telemetry import configure_telemetry, span, start_metrics_server
+from src.index_factory import TRAINING_SAMPLE_SIZE
 
 load_dotenv()
 
@@ -159,6 +172,8 @@ if 'vector_store_manager' not in st.session_state:
     st.session_state.vector_store_manager = None
 if 'rag_pipeline' not in st.session_state:
     st.session_state.rag_pipeline = None
+if 'reranker' not in st.session_state:
+    st.session_state.reranker = None
 if 'documents_loaded' not in st.session_state:
     st.session_state.documents_loaded = {}
 if 'chat_history' not in st.session_state:
@@ -167,49 +182,215 @@ if 'auto_loaded' not in st.session_state:
     st.session_state.auto_loaded = {}
 if 'current_provider' not in st.session_state:
     st.session_state.current_provider = None
+if 'resources' not in st.session_state:
+    st.session_state.resources = registry.lease()
+if 'api_client' not in st.session_state:
+    st.session_state.api_client = None
+
+def get_api_url() -> str:
+    return os.getenv("RAG_API_URL", "").strip()
+
+def setup_telemetry():
+    if os.getenv("TELEMETRY", "false").lower() not in ("1", "true", "yes"):
+        return
+    configure_telemetry(opentelemetry=os.getenv("TELEMETRY_OTEL", "false").lower() in ("1", "true", "yes"))
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
 
 def get_vector_store_path(provider: str) -> str:
     return f"vector_store_{provider}"
 
+def acquire_shared(key: str, factory, dispose=None):
+    return st.session_state.resources.acquire(key, factory, dispose)
+
+def release_session_resources():
+    st.session_state.resources.release_all()
+
+def create_answer_cache():
+    if os.getenv("ANSWER_CACHE", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return SemanticAnswerCache(
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    )
+
+def invalidate_answer_cache(filepaths=None):
+    answer_cache = getattr(st.session_state.rag_pipeline, "answer_cache", None)
+    if answer_cache is None:
+        return
+    if filepaths is None:
+        answer_cache.clear()
+    else:
+        answer_cache.invalidate_sources(filepaths)
+
+def create_context_packer():
+    budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500") or 0)
+    return ContextPacker(max_tokens=budget) if budget > 0 else None
+
+def rerank_enabled() -> bool:
+    return os.getenv("RERANK", "false").lower() in ("1", "true", "yes")
+
+def create_reranker() -> CrossEncoderReranker:
+    return CrossEncoderReranker(
+        model_name=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150"))
+    )
+
+def index_options() -> dict:
+    nprobe = os.getenv("VECTOR_INDEX_NPROBE")
+    ef_search = os.getenv("VECTOR_INDEX_EF_SEARCH")
+    rescore_factor = os.getenv("VECTOR_RESCORE_FACTOR")
+    return {
+        "index_type": os.getenv("VECTOR_INDEX_TYPE", "flat").lower(),
+        "nprobe": int(nprobe) if nprobe else None,
+        "ef_search": int(ef_search) if ef_search else None,
+        "use_mmap": os.getenv("VECTOR_STORE_MMAP", "false").lower() in ("1", "true", "yes"),
+        "quantization": os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+        "rescore_factor": float(rescore_factor) if rescore_factor else None
+    }
+
+def embedding_dimensions():
+    dimensions = os.getenv("OPENAI_EMBEDDING_DIMENSIONS")
+    return int(dimensions) if dimensions else None
+
 def initialize_components(provider: str, api_key: str = None, model_name: str = None):
     if st.session_state.current_provider != provider:
         st.session_state.auto_loaded[provider] = False
         st.session_state.chat_history = []
         
     if st.session_state.current_provider != provider or st.session_state.vector_store_manager is None:
+        release_session_resources()
         if provider == "openai":
             if not api_key:
                 raise ValueError("OpenAI API key required")
             openai_model = model_name or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
             embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-            st.session_state.vector_store_manager = OpenAIVectorStore(api_key, embedding_model=embedding_model)
-            st.session_state.rag_pipeline = OpenAIRAGPipeline(api_key, model=openai_model)
+            dimensions = embedding_dimensions()
+            key_id = hashlib.sha256(api_key.encode()).hexdigest()[:12]
+            http_client = get_http_pool("openai").sync_client()
+            embeddings = acquire_shared(f"embeddings:openai:{embedding_model}:{dimensions}:{key_id}", lambda: OpenAIEmbeddings(openai_api_key=api_key, model=embedding_model, dimensions=dimensions, http_client=http_client))
+            client = acquire_shared(f"client:openai:{key_id}", lambda: openai.OpenAI(api_key=api_key, http_client=http_client))
+            llm = acquire_shared(f"llm:openai:{openai_model}:{key_id}", lambda: ChatOpenAI(openai_api_key=api_key, model=openai_model, temperature=0, http_client=http_client))
+            st.session_state.vector_store_manager = acquire_shared(
+                f"index:openai:{embedding_model}:{dimensions}:{key_id}:{index_options()['index_type']}:{index_options()['quantization']}",
+                lambda: OpenAIVectorStore(api_key, embedding_model=embedding_model, embedding_dimensions=dimensions, embeddings=embeddings, **index_options())
+            )
+            answer_cache = acquire_shared(f"answer_cache:openai:{key_id}", create_answer_cache)
+            st.session_state.rag_pipeline = acquire_shared(
+                f"pipeline:openai:{openai_model}:{key_id}",
+                lambda: OpenAIRAGPipeline(api_key, model=openai_model, embedding_model=embedding_model, llm=llm, openai_client=client, answer_cache=answer_cache, context_packer=create_context_packer())
+            )
         else:
-            st.session_state.vector_store_manager = OllamaVectorStore()
-            st.session_state.rag_pipeline = OllamaRAGPipeline(model=model_name or "qwen2.5:0.5b")
+            ollama_model = model_name or "qwen2.5:0.5b"
+            embeddings = acquire_shared(
+                "embeddings:huggingface:all-MiniLM-L6-v2",
+                lambda: HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={'device': 'cpu'})
+            )
+            st.session_state.vector_store_manager = acquire_shared(f"index:ollama:{index_options()['index_type']}:{index_options()['quantization']}", lambda: OllamaVectorStore(embeddings=embeddings, **index_options()))
+            answer_cache = acquire_shared("answer_cache:ollama", create_answer_cache)
+            st.session_state.rag_pipeline = acquire_shared(
+                f"pipeline:ollama:{ollama_model}",
+                lambda: OllamaRAGPipeline(model=ollama_model, embeddings=embeddings, answer_cache=answer_cache, context_packer=create_context_packer())
+            )
+        rerank_model = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        st.session_state.reranker = acquire_shared(f"reranker:{rerank_model}", create_reranker)
         st.session_state.current_provider = provider
 
+def get_index_path(provider: str) -> str:
+    return os.path.join(st.session_state.vector_store_manager.persist_directory, get_vector_store_path(provider), "faiss_index")
+
+def background_indexing_enabled() -> bool:
+    return os.getenv("BACKGROUND_INDEXING", "true").lower() in ("1", "true", "yes")
+
+def get_background_indexer(provider: str):
+    return registry.get(f"indexer:{provider}:{id(st.session_state.vector_store_manager)}")
+
+def start_background_indexer(provider: str) -> BackgroundIndexer:
+    manager = st.session_state.vector_store_manager
+    answer_cache = getattr(st.session_state.rag_pipeline, "answer_cache", None)
+    key = f"indexer:{provider}:{id(manager)}"
+    if key in st.session_state.resources:
+        return registry.get(key)
+    
+    def create_indexer():
+        vector_store_path = get_vector_store_path(provider)
+        auto_loader = DocumentAutoLoader(docs_folder="docs", metadata_file=f"{vector_store_path}/processed_files.json")
+        if answer_cache is not None:
+            auto_loader.add_change_listener(answer_cache.invalidate_sources)
+        indexer = BackgroundIndexer(
+            manager,
+            auto_loader,
+            index_name=f"{vector_store_path}/faiss_index",
+            debounce_seconds=float(os.getenv("INDEXER_DEBOUNCE_SECONDS", "2")),
+            poll_interval=float(os.getenv("INDEXER_POLL_SECONDS", "10"))
+        )
+        indexer.start()
+        return indexer
+    
+    return acquire_shared(key, create_indexer, dispose=lambda indexer: indexer.stop())
+
+def index_files_streaming(file_paths: list, create: bool = False) -> int:
+    processor = DocumentProcessor()
+    manager = st.session_state.vector_store_manager
+    num_chunks = 0
+    training_size = TRAINING_SAMPLE_SIZE if create and manager.requires_training() else 0
+    pending = []
+    with manager.write_lock:
+        for batch in processor.iter_document_batches(file_paths):
+            num_chunks += len(batch)
+            if not create:
+                manager.add_documents(batch)
+                continue
+            pending.extend(batch)
+            if len(pending) >= training_size:
+                manager.create_vector_store(pending)
+                pending = []
+                create = False
+        if pending:
+            manager.create_vector_store(pending)
+    if processor.file_timings:
+        slowest = max(processor.file_timings, key=processor.file_timings.get)
+        st.caption(f"Parsed {len(processor.file_timings)} files in {sum(processor.file_timings.values()):.1f}s CPU (slowest: {os.path.basename(slowest)}, {processor.file_timings[slowest]:.2f}s)")
+    return num_chunks
+
 def auto_load_documents(provider: str):
     if not st.session_state.auto_loaded.get(provider, False):
         vector_store_path = get_vector_store_path(provider)
         metadata_file = f"{vector_store_path}/processed_files.json"
         auto_loader = DocumentAutoLoader(docs_folder="docs", metadata_file=metadata_file)
-        vector_store_exists = os.path.exists(f"{vector_store_path}/faiss_index")
+        auto_loader.add_change_listener(invalidate_answer_cache)
+        manager = st.session_state.vector_store_manager
+        vector_store_exists = manager.vector_store is not None or os.path.exists(get_index_path(provider))
         
         if vector_store_exists:
             try:
-                st.session_state.vector_store_manager.load(f"{vector_store_path}/faiss_index")
+                with manager.write_lock:
+                    if manager.vector_store is None:
+                        manager.load(f"{vector_store_path}/faiss_index")
                 st.session_state.documents_loaded[provider] = True
+                if background_indexing_enabled():
+                    start_background_indexer(provider)
+                    st.session_state.auto_loaded[provider] = True
+                    return
                 unprocessed = auto_loader.get_unprocessed_files()
+                deleted = auto_loader.get_deleted_files()
                 
-                if unprocessed:
-                    with st.spinner(f"Processing {len(unprocessed)} new documents..."):
+                if unprocessed or deleted:
+                    with st.spinner(f"Updating {len(unprocessed) + len(deleted)} changed documents..."):
                         processor = DocumentProcessor()
-                        documents = processor.process_multiple_documents(unprocessed)
-                        st.session_state.vector_store_manager.add_documents(documents)
+                        added = removed = 0
+                        for file_path in unprocessed:
+                            stats = st.session_state.vector_store_manager.upsert_file(file_path, processor.process_document(file_path))
+                            added += stats["added"]
+                            removed += stats["removed"]
+                        for file_path in deleted:
+                            removed += st.session_state.vector_store_manager.delete_file(file_path)
                         st.session_state.vector_store_manager.save(f"{vector_store_path}/faiss_index")
                         auto_loader.mark_as_processed(unprocessed)
-                        st.success(f"Added {len(unprocessed)} new documents")
+                        auto_loader.mark_as_removed(deleted)
+                        st.success(f"Updated {len(unprocessed)} documents and removed {len(deleted)} ({added} chunks embedded, {removed} stale chunks dropped)")
                 
                 st.session_state.auto_loaded[provider] = True
             except:
@@ -218,14 +399,14 @@ def auto_load_documents(provider: str):
             all_files = auto_loader.get_all_docs_files()
             if all_files:
                 with st.spinner(f"Processing {len(all_files)} documents..."):
-                    processor = DocumentProcessor()
-                    documents = processor.process_multiple_documents(all_files)
-                    if documents:
-                        st.session_state.vector_store_manager.create_vector_store(documents)
+                    num_chunks = index_files_streaming(all_files, create=True)
+                    if num_chunks:
                         st.session_state.vector_store_manager.save(f"{vector_store_path}/faiss_index")
                         st.session_state.documents_loaded[provider] = True
                         auto_loader.mark_as_processed(all_files)
                         st.success(f"Loaded {len(all_files)} documents")
+            if background_indexing_enabled() and st.session_state.documents_loaded.get(provider, False):
+                start_background_indexer(provider)
             st.session_state.auto_loaded[provider] = True
 
 def get_confidence_class(confidence: int) -> str:
@@ -237,52 +418,68 @@ def get_confidence_class(confidence: int) -> str:
         return "confidence-low"
 
 def main():
+    setup_telemetry()
     st.markdown('<div class="main-header">Mini RAG Assistant</div>', unsafe_allow_html=True)
     
     with st.sidebar:
         st.header("Configuration")
-        default_provider = os.getenv("LLM_PROVIDER", "ollama").lower()
-        provider = st.radio(
-            "Select LLM Provider",
-            options=["ollama", "openai"],
-            index=0 if default_provider == "ollama" else 1
-        )
-        
-        if provider == "openai":
-            api_key = os.getenv("OPENAI_API_KEY", "")
-            if not api_key:
-                api_key = st.text_input("OpenAI API Key", type="password")
-                if not api_key:
-                    st.error("Please enter your OpenAI API key")
-                    st.stop()
-            openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-            embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-            st.success("OpenAI configured")
-            st.info(f"Model: {openai_model}")
-            st.info(f"Embedding: {embedding_model}")
+        api_url = get_api_url()
+        if api_url:
+            if st.session_state.api_client is None:
+                st.session_state.api_client = RAGServiceClient(api_url)
             try:
-                initialize_components(provider, api_key=api_key, model_name=openai_model)
-                auto_load_documents(provider)
+                service_stats = st.session_state.api_client.get_stats()
             except Exception as e:
-                st.error(f"Error: {str(e)}")
+                st.error(f"Cannot reach the RAG API at {api_url}: {str(e)}")
                 st.stop()
-            badge_class = "openai-badge"
-            badge_text = "OpenAI"
+            provider = service_stats["provider"]
+            st.success(f"Connected to {api_url}")
+            st.session_state.documents_loaded[provider] = service_stats["index"]["status"] == "initialized"
+            badge_class = f"{provider}-badge"
+            badge_text = "OpenAI" if provider == "openai" else "Ollama"
         else:
-            model_name = st.text_input(
-                "Ollama Model",
-                value=os.getenv("OLLAMA_MODEL", "qwen2.5:0.5b")
+            default_provider = os.getenv("LLM_PROVIDER", "ollama").lower()
+            provider = st.radio(
+                "Select LLM Provider",
+                options=["ollama", "openai"],
+                index=0 if default_provider == "ollama" else 1
             )
-            try:
-                initialize_components(provider, model_name=model_name)
-                auto_load_documents(provider)
-                st.success("Ollama connected")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                st.info("Make sure Ollama is running")
-                st.stop()
-            badge_class = "ollama-badge"
-            badge_text = "Ollama"
+            
+            if provider == "openai":
+                api_key = os.getenv("OPENAI_API_KEY", "")
+                if not api_key:
+                    api_key = st.text_input("OpenAI API Key", type="password")
+                    if not api_key:
+                        st.error("Please enter your OpenAI API key")
+                        st.stop()
+                openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+                embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+                st.success("OpenAI configured")
+                st.info(f"Model: {openai_model}")
+                st.info(f"Embedding: {embedding_model}")
+                try:
+                    initialize_components(provider, api_key=api_key, model_name=openai_model)
+                    auto_load_documents(provider)
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
+                    st.stop()
+                badge_class = "openai-badge"
+                badge_text = "OpenAI"
+            else:
+                model_name = st.text_input(
+                    "Ollama Model",
+                    value=os.getenv("OLLAMA_MODEL", "qwen2.5:0.5b")
+                )
+                try:
+                    initialize_components(provider, model_name=model_name)
+                    auto_load_documents(provider)
+                    st.success("Ollama connected")
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
+                    st.info("Make sure Ollama is running")
+                    st.stop()
+                badge_class = "ollama-badge"
+                badge_text = "Ollama"
         
         st.divider()
         st.header("Document Upload")
@@ -295,31 +492,39 @@ def main():
         if uploaded_files:
             if st.button("Process Documents", type="primary"):
                 with st.spinner("Processing..."):
-                    os.makedirs("uploaded_docs", exist_ok=True)
-                    file_paths = []
-                    for uploaded_file in uploaded_files:
-                        file_path = os.path.join("uploaded_docs", uploaded_file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        file_paths.append(file_path)
-                    
-                    processor = DocumentProcessor()
-                    documents = processor.process_multiple_documents(file_paths)
-                    
-                    vector_store_path = get_vector_store_path(provider)
-                    if st.session_state.documents_loaded.get(provider, False):
-                        st.session_state.vector_store_manager.add_documents(documents)
-                    else:
-                        st.session_state.vector_store_manager.create_vector_store(documents)
+                    if api_url:
+                        ingest_stats = st.session_state.api_client.ingest([(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files])
                         st.session_state.documents_loaded[provider] = True
-                    
-                    st.session_state.vector_store_manager.save(f"{vector_store_path}/faiss_index")
-                    st.success(f"Processed {len(uploaded_files)} documents into {len(documents)} chunks")
+                        st.success(f"Processed {ingest_stats['files']} documents into {ingest_stats['chunks']} chunks")
+                    else:
+                        os.makedirs("uploaded_docs", exist_ok=True)
+                        file_paths = []
+                        for uploaded_file in uploaded_files:
+                            file_path = os.path.join("uploaded_docs", uploaded_file.name)
+                            with open(file_path, "wb") as f:
+                                f.write(uploaded_file.getbuffer())
+                            file_paths.append(file_path)
+                        
+                        processor = DocumentProcessor()
+                        manager = st.session_state.vector_store_manager
+                        num_chunks = 0
+                        
+                        vector_store_path = get_vector_store_path(provider)
+                        with manager.write_lock:
+                            for file_path in file_paths:
+                                documents = processor.process_document(file_path)
+                                manager.upsert_file(file_path, documents)
+                                num_chunks += len(documents)
+                            st.session_state.documents_loaded[provider] = manager.vector_store is not None
+                            
+                            manager.save(f"{vector_store_path}/faiss_index")
+                        invalidate_answer_cache(file_paths)
+                        st.success(f"Processed {len(uploaded_files)} documents into {num_chunks} chunks")
         
         st.divider()
         st.header("Document Management")
         
-        if st.button("Reprocess Docs Folder"):
+        if not api_url and st.button("Reprocess Docs Folder"):
             with st.spinner("Reprocessing all documents..."):
                 try:
                     vector_store_path = get_vector_store_path(provider)
@@ -332,16 +537,15 @@ def main():
                     all_files = auto_loader.get_all_docs_files()
                     
                     if all_files:
-                        processor = DocumentProcessor()
-                        documents = processor.process_multiple_documents(all_files)
+                        num_chunks = index_files_streaming(all_files, create=True)
                         
-                        st.session_state.vector_store_manager.create_vector_store(documents)
                         st.session_state.vector_store_manager.save(f"{vector_store_path}/faiss_index")
                         st.session_state.documents_loaded[provider] = True
                         
                         auto_loader.mark_as_processed(all_files)
+                        invalidate_answer_cache()
                         
-                        st.success(f"Reprocessed {len(all_files)} documents into {len(documents)} chunks")
+                        st.success(f"Reprocessed {len(all_files)} documents into {num_chunks} chunks")
                         st.rerun()
                     else:
                         st.warning("No documents found in docs folder")
@@ -351,10 +555,36 @@ def main():
         st.divider()
         st.header("Search Settings")
         num_results = st.slider("Sources to retrieve", 1, 10, 4)
+        retrieval_options = ["dense", "hybrid"]
+        default_retrieval = os.getenv("RETRIEVAL_MODE", "dense").lower()
+        retrieval_mode = st.selectbox(
+            "Retrieval",
+            options=retrieval_options,
+            index=retrieval_options.index(default_retrieval) if default_retrieval in retrieval_options else 0,
+            help="dense: embedding similarity only. hybrid: fuse embedding and BM25 keyword rankings, which helps with exact codes, form numbers and names"
+        )
+        if api_url:
+            source_options = st.session_state.api_client.list_values("source")
+        else:
+            source_options = st.session_state.vector_store_manager.list_values("source") if st.session_state.vector_store_manager else []
+        selected_sources = st.multiselect("Limit to documents", options=source_options,
+                                          help="Only search chunks from the selected documents. Leave empty to search everything")
+        enable_rerank = st.checkbox("Rerank sources", value=rerank_enabled(),
+                                    help="Over-fetch candidates and keep the best ones according to a small cross-encoder, within a per-query time budget")
         enable_highlighting = st.checkbox("Highlight relevant text", value=True, 
                                          help="Highlights parts of sources that were used to generate the answer")
         enable_conversation_context = st.checkbox("Multi-turn conversation", value=False,
                                                   help="Include previous Q&A in context for follow-up questions")
+        stream_answers = st.checkbox("Stream answers", value=True,
+                                     help="Show the answer token by token as the model generates it")
+        strategy_options = ["sequential", "fused", "async"]
+        default_strategy = os.getenv("ANSWER_STRATEGY", "sequential").lower()
+        answer_strategy = st.selectbox(
+            "Answer strategy",
+            options=strategy_options,
+            index=strategy_options.index(default_strategy) if default_strategy in strategy_options else 0,
+            help="sequential: answer then confidence (2 LLM calls). fused: answer and confidence from one call. async: show the answer while confidence is scored in the background"
+        )
         
         if enable_conversation_context:
             st.success("✓ Multi-turn mode: ON - Follow-up questions will use conversation history")
@@ -366,6 +596,20 @@ def main():
             if stats['status'] == 'initialized':
                 st.metric("Status", "Ready")
                 st.metric("Vectors", stats['num_vectors'])
+                if stats['index_type'] != "flat":
+                    st.caption(f"Index: {stats['index_type']} ({stats['index_bytes'] / 1e6:.1f} MB)")
+            indexer = get_background_indexer(provider)
+            if indexer is not None and indexer.is_running:
+                st.caption(f"Background indexer: watching docs/ ({indexer.mode})")
+                if indexer.last_run:
+                    st.caption(f"Last update: {indexer.last_run['files_indexed']} files indexed, {indexer.last_run['files_removed']} removed")
+                if indexer.last_error:
+                    st.warning(f"Background indexer error: {indexer.last_error}")
+        elif api_url and service_stats["index"]["status"] == "initialized":
+            st.metric("Status", "Ready")
+            st.metric("Vectors", service_stats["index"]["num_vectors"])
+            coalescing = service_stats["coalescing"]
+            st.caption(f"API worker {service_stats['pid']}: {coalescing['requests']} queries, {coalescing['coalesced']} coalesced")
     
     st.markdown(f'<div class="sub-header">Ask questions about your documents <span class="provider-badge {badge_class}">{badge_text}</span></div>', unsafe_allow_html=True)
     
@@ -385,32 +629,85 @@ def main():
         if search_button and query:
             with st.spinner("Searching..."):
                 try:
-                    conversation_history = []
-                    enhanced_query = query
-                    
-                    if enable_conversation_context and st.session_state.chat_history:
-                        for chat in st.session_state.chat_history[-3:]:
-                            conversation_history.append({
-                                "question": chat["question"],
-                                "answer": chat["result"]["answer"]
-                            })
+                    with span("app.question", provider=st.session_state.current_provider, strategy=answer_strategy) as question_span:
+                        conversation_history = []
+                        enhanced_query = query
                         
-                        last_question = st.session_state.chat_history[-1]["question"]
-                        enhanced_query = f"{last_question} {query}"
+                        if enable_conversation_context and st.session_state.chat_history:
+                            for chat in st.session_state.chat_history[-3:]:
+                                conversation_history.append({
+                                    "question": chat["question"],
+                                    "answer": chat["result"]["answer"]
+                                })
+                            
+                            last_question = st.session_state.chat_history[-1]["question"]
+                            enhanced_query = f"{last_question} {query}"
+                            
+                            with st.expander("Debug: Enhanced Query", expanded=False):
+                                st.write(f"**Original:** {query}")
+                                st.write(f"**Enhanced:** {enhanced_query}")
+                                st.write(f"**History items:** {len(conversation_history)}")
                         
-                        with st.expander("Debug: Enhanced Query", expanded=False):
-                            st.write(f"**Original:** {query}")
-                            st.write(f"**Enhanced:** {enhanced_query}")
-                            st.write(f"**History items:** {len(conversation_history)}")
-                    
-                    retrieved_docs = st.session_state.vector_store_manager.similarity_search(enhanced_query, k=num_results)
-                    
-                    result = st.session_state.rag_pipeline.query(
-                        query, 
-                        retrieved_docs, 
-                        enable_highlighting=enable_highlighting,
-                        conversation_history=conversation_history
-                    )
+                        rerank_stats = None
+                        search_filter = {"source": selected_sources} if selected_sources else None
+                        if api_url:
+                            result = st.session_state.api_client.query(
+                                query,
+                                k=num_results,
+                                mode=retrieval_mode,
+                                filter=search_filter,
+                                strategy=answer_strategy,
+                                enable_highlighting=enable_highlighting,
+                                conversation_history=conversation_history,
+                                retrieval_query=enhanced_query,
+                                rerank=enable_rerank
+                            )
+                        elif enable_rerank and st.session_state.reranker is not None:
+                            overfetch = int(os.getenv("RERANK_OVERFETCH", "3"))
+                            candidates = st.session_state.vector_store_manager.similarity_search(enhanced_query, k=num_results * overfetch, mode=retrieval_mode, filter=search_filter)
+                            top_n = min(num_results, int(os.getenv("RERANK_TOP_N", str(num_results))))
+                            retrieved_docs, rerank_stats = st.session_state.reranker.rerank(enhanced_query, candidates, top_n=top_n, baseline_k=num_results)
+                        else:
+                            retrieved_docs = st.session_state.vector_store_manager.similarity_search(enhanced_query, k=num_results, mode=retrieval_mode, filter=search_filter)
+                        
+                        if stream_answers and not api_url:
+                            preview = st.empty()
+                            streamed_text = ""
+                            result = None
+                            for event in st.session_state.rag_pipeline.stream_query(
+                                query,
+                                retrieved_docs,
+                                enable_highlighting=enable_highlighting,
+                                conversation_history=conversation_history,
+                                strategy=answer_strategy
+                            ):
+                                if event["type"] == "token":
+                                    streamed_text += event["content"]
+                                    preview.markdown(f"**Question:** {query}\n\n**Answer:** {streamed_text}▌")
+                                elif event["type"] == "done":
+                                    result = event["result"]
+                            preview.empty()
+                        elif not api_url:
+                            result = st.session_state.rag_pipeline.query(
+                                query, 
+                                retrieved_docs, 
+                                enable_highlighting=enable_highlighting,
+                                conversation_history=conversation_history,
+                                strategy=answer_strategy
+                            )
+                        if "confidence_future" in result:
+                            preview = st.empty()
+                            with preview.container():
+                                st.write(f"**Question:** {query}")
+                                st.write(f"**Answer:** {result['answer']}")
+                                st.caption("Scoring confidence...")
+                            st.session_state.rag_pipeline.resolve_confidence(result)
+                            preview.empty()
+                        if rerank_stats is not None:
+                            result["rerank"] = rerank_stats
+                    timings = question_span.breakdown()
+                    if timings:
+                        result["timings"] = dict(timings, total=question_span.duration * 1000)
                     st.session_state.chat_history.append({"question": query, "result": result})
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
@@ -428,6 +725,23 @@ def main():
                         f"<strong>Confidence Score:</strong> <span class='{confidence_class}'>{confidence}%</span>",
                         unsafe_allow_html=True
                     )
+                    if chat['result'].get('cached'):
+                        st.caption("Served from the answer cache")
+                    metrics = chat['result'].get('metrics')
+                    if metrics and metrics.get('time_to_first_token_ms') is not None:
+                        st.caption(f"First token after {metrics['time_to_first_token_ms']:.0f} ms, complete after {metrics['total_ms']:.0f} ms")
+                    packing = chat['result'].get('packing')
+                    if packing and packing['tokens_saved'] > 0:
+                        st.caption(f"Context packed to {packing['tokens_after']:,} tokens ({packing['tokens_saved']:,} saved, {packing['chunks_kept']} of {packing['chunks_total']} chunks kept)")
+                    timings = chat['result'].get('timings')
+                    if timings:
+                        st.caption("Timings: " + " · ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items()))
+                    rerank_stats = chat['result'].get('rerank')
+                    if rerank_stats:
+                        if rerank_stats['skipped']:
+                            st.caption(f"Reranking skipped: over the time budget ({rerank_stats['elapsed_ms']:.0f} ms)")
+                        else:
+                            st.caption(f"Reranked {rerank_stats['scored']} of {rerank_stats['candidates']} candidates in {rerank_stats['elapsed_ms']:.0f} ms, {rerank_stats['context_chars_saved']:,} context characters saved")
                     
                     with st.expander(f"View {len(chat['result'].get('sources', []))} Source Documents", expanded=False):
                         sources = chat['result'].get('sources', [])
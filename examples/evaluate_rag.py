@@ -68,9 +68,7 @@ def example_grounding_accuracy():
     print(f"\nQuestion: {question}")
     print(f"\nAnswer: {answer}")
     
-    import openai
-    llm_client = openai.OpenAI(api_key=api_key)
-    evaluator = RAGEvaluator(llm_client=llm_client)
+    evaluator = rag_pipeline.evaluator
     
     grounding = evaluator.grounding_accuracy(answer, retrieved_docs, use_llm=True)
     print(f"\nGrounding Score: {grounding['grounding_score']:.2%}")
@@ -108,9 +106,7 @@ def example_answer_relevancy():
     print(f"\nQuestion: {question}")
     print(f"\nAnswer: {answer}")
     
-    import openai
-    llm_client = openai.OpenAI(api_key=api_key)
-    evaluator = RAGEvaluator(llm_client=llm_client)
+    evaluator = rag_pipeline.evaluator
     
     relevancy = evaluator.answer_relevancy(question, answer, use_llm=True)
     print(f"\nRelevancy Score: {relevancy['relevancy_score']:.2%}")
@@ -148,9 +144,7 @@ def example_full_evaluation():
     print(f"\nQuestion: {question}")
     print(f"\nAnswer: {answer[:200]}...")
     
-    import openai
-    llm_client = openai.OpenAI(api_key=api_key)
-    evaluator = RAGEvaluator(llm_client=llm_client)
+    evaluator = rag_pipeline.evaluator
     
     relevant_doc_ids = ["docs/sample_policy.txt"]
     
@@ -203,9 +197,7 @@ def example_batch_evaluation():
     # Load vector store
     vector_store.load("vector_store_openai/faiss_index")
     
-    import openai
-    llm_client = openai.OpenAI(api_key=api_key)
-    evaluator = RAGEvaluator(llm_client=llm_client)
+    evaluator = rag_pipeline.evaluator
     
     test_queries = [
         "What is the vacation policy?",
@@ -213,11 +205,15 @@ def example_batch_evaluation():
         "What are the working hours?"
     ]
     
+    retrieved_batches = vector_store.batch_similarity_search(test_queries, k=3)
+    answers = rag_pipeline.batch_query(test_queries, retrieved_batches, enable_highlighting=False, max_concurrency=4)
+    
     results = []
     
-    for question in test_queries:
-        retrieved_docs = vector_store.similarity_search(question, k=3)
-        result = rag_pipeline.query(question, retrieved_docs)
+    for question, retrieved_docs, result in zip(test_queries, retrieved_batches, answers):
+        if 'error' in result:
+            print(f"\n Skipping '{question}': {result['error']}")
+            continue
         
         eval_result = evaluator.evaluate_full(
             question=question,
@@ -240,6 +236,10 @@ def example_batch_evaluation():
         print(f"\n{i}. {r['question']}")
         print(f"   Grounding: {r['grounding']:.2%} | Relevancy: {r['relevancy']:.2%}")
     
+    if not results:
+        print("\nNo questions were answered successfully")
+        return
+    
     # Calculate averages
     avg_grounding = sum(r['grounding'] for r in results) / len(results)
     avg_relevancy = sum(r['relevancy'] for r in results) / len(results)
@@ -250,6 +250,34 @@ def example_batch_evaluation():
     print("=" * 60)
 
 
+def example_retrieval_sweep():
+    print("\n" + "=" * 60)
+    print("Example 6: Retrieval Metrics Across Cutoffs")
+    print("=" * 60)
+    
+    api_key = os.getenv("OPENAI_API_KEY")
+    vector_store = VectorStoreManager(api_key)
+    vector_store.load("vector_store_openai/faiss_index")
+    
+    evaluator = RAGEvaluator()
+    
+    labelled_queries = {
+        "What is the vacation policy?": ["docs/sample_policy.txt"],
+        "How many sick days are allowed?": ["docs/sample_policy.txt"],
+        "What are the working hours?": ["docs/sample_policy.txt"]
+    }
+    
+    ranked_results = vector_store.batch_similarity_search(list(labelled_queries), k=10)
+    metrics = evaluator.batch_retrieval_metrics(ranked_results, list(labelled_queries.values()), ks=(1, 3, 5, 10))
+    
+    print(f"\n{'k':>4} {'P@k':>8} {'R@k':>8} {'MRR@k':>8} {'nDCG@k':>8} {'MAP@k':>8}")
+    for k in metrics['ks']:
+        print(f"{k:>4} {metrics['precision_at_k'][k]:>8.3f} {metrics['recall_at_k'][k]:>8.3f} "
+              f"{metrics['mrr_at_k'][k]:>8.3f} {metrics['ndcg_at_k'][k]:>8.3f} {metrics['map_at_k'][k]:>8.3f}")
+    
+    print("=" * 60)
+
+
 if __name__ == "__main__":
     print("\n RAG Evaluation Examples\n")
     
@@ -259,6 +287,7 @@ if __name__ == "__main__":
         example_answer_relevancy()
         example_full_evaluation()
         example_batch_evaluation()
+        example_retrieval_sweep()
         
         print("\n✅ All examples completed!")
         print("\nNext steps:")
@@ -0,0 +1,151 @@
+import re
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+PER_REQUEST_FIELDS = ("confidence_future", "metrics", "cached", "timings")
+
+
+class SemanticAnswerCache:
+
+    def __init__(
+        self,
+        embedding_function: Optional[Callable[[List[str]], List[np.ndarray]]] = None,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000
+    ):
+        self.embedding_function = embedding_function
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        question = re.sub(r"\s+", " ", question.lower()).strip()
+        return question.rstrip("?.! ")
+
+    @staticmethod
+    def chunk_ids(retrieved_docs: List[Tuple[Document, float]]) -> Tuple[str, ...]:
+        ids = []
+        for doc, _ in retrieved_docs:
+            ids.append(getattr(doc, "id", None) or f"{doc.metadata.get('source', '')}:{doc.metadata.get('chunk_id', '')}")
+        return tuple(ids)
+
+    def _group_key(self, retrieved_docs: List[Tuple[Document, float]], model: str, variant: str) -> str:
+        payload = "\x1f".join((model, variant) + self.chunk_ids(retrieved_docs))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.embedding_function is None:
+            return None
+        try:
+            vector = np.asarray(self.embedding_function([question])[0], dtype=np.float32)
+        except:
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds
+
+    def lookup(self, question: str, retrieved_docs: List[Tuple[Document, float]], model: str, variant: str = "") -> Optional[Dict]:
+        normalized = self.normalize_question(question)
+        group = self._group_key(retrieved_docs, model, variant)
+        key = f"{group}:{normalized}"
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry["result"])
+            candidates = [
+                (entry_key, entry) for entry_key, entry in self._entries.items()
+                if entry["group"] == group and entry["embedding"] is not None and not self._expired(entry, now)
+            ]
+
+        if not candidates:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        query_embedding = self._embed(normalized)
+        best_key, best_score = None, -1.0
+        if query_embedding is not None:
+            matrix = np.stack([entry["embedding"] for _, entry in candidates])
+            scores = matrix @ query_embedding
+            best = int(np.argmax(scores))
+            best_key, best_score = candidates[best][0], float(scores[best])
+
+        with self._lock:
+            if best_key is not None and best_score >= self.similarity_threshold and best_key in self._entries:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                self.semantic_hits += 1
+                return copy.deepcopy(self._entries[best_key]["result"])
+            self.misses += 1
+        return None
+
+    def store(self, question: str, retrieved_docs: List[Tuple[Document, float]], model: str, result: Dict, variant: str = ""):
+        normalized = self.normalize_question(question)
+        group = self._group_key(retrieved_docs, model, variant)
+        sources = set()
+        for doc, _ in retrieved_docs:
+            sources.add(doc.metadata.get("source", ""))
+            if doc.metadata.get("file_path"):
+                sources.add(doc.metadata["file_path"])
+
+        cached_result = {k: v for k, v in result.items() if k not in PER_REQUEST_FIELDS}
+        entry = {
+            "group": group,
+            "created": time.time(),
+            "embedding": self._embed(normalized),
+            "sources": sources,
+            "result": copy.deepcopy(cached_result)
+        }
+        with self._lock:
+            self._entries[f"{group}:{normalized}"] = entry
+            self._entries.move_to_end(f"{group}:{normalized}")
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_sources(self, paths: Iterable[str]) -> int:
+        names = set()
+        for path in paths:
+            names.add(path)
+            names.add(path.replace("\\", "/").rsplit("/", 1)[-1])
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["sources"] & names]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,30 @@
+from typing import Dict, List, Optional, Tuple
+import httpx
+from .http_pool import get_http_pool
+
+
+class RAGServiceClient:
+
+    def __init__(self, base_url: str, timeout: float = 300.0, http_client: Optional[httpx.Client] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.http_client = http_client or get_http_pool("rag_api").sync_client()
+
+    def _request(self, method: str, path: str, **kwargs) -> Dict:
+        response = self.http_client.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        if response.status_code == 400:
+            raise ValueError(response.json().get("detail", response.text))
+        response.raise_for_status()
+        return response.json()
+
+    def query(self, question: str, **options) -> Dict:
+        return self._request("POST", "/query", json=dict(options, question=question))
+
+    def ingest(self, files: List[Tuple[str, bytes]]) -> Dict:
+        return self._request("POST", "/ingest", files=[("files", (name, content)) for name, content in files])
+
+    def get_stats(self) -> Dict:
+        return self._request("GET", "/stats")
+
+    def list_values(self, field: str = "source") -> List:
+        return self._request("GET", "/sources", params={"field": field})["values"]
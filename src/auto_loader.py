@@ -1,16 +1,38 @@
 import os
 import json
 import hashlib
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
 from pathlib import Path
 
 class DocumentAutoLoader:
-    def __init__(self, docs_folder: str = "docs", metadata_file: str = "vector_store/processed_files.json"):
+    def __init__(self, docs_folder: str = "docs", metadata_file: str = "vector_store/processed_files.json", recursive: bool = True, scan_workers: int = 8, parallel_scan_threshold: int = 64):
         self.docs_folder = docs_folder
         self.metadata_file = metadata_file
+        self.recursive = recursive
+        self.scan_workers = scan_workers
+        self.parallel_scan_threshold = parallel_scan_threshold
         self.processed_files = self._load_metadata()
+        self._pending_records = {}
+        self.change_listeners: List[Callable[[List[str]], None]] = []
         os.makedirs(docs_folder, exist_ok=True)
     
+    def add_change_listener(self, listener: Callable[[List[str]], None]):
+        self.change_listeners.append(listener)
+    
+    def _notify_changed(self, filepaths: List[str]):
+        if not filepaths:
+            return
+        for listener in self.change_listeners:
+            try:
+                listener(list(filepaths))
+            except:
+                pass
+    
+    def reload(self):
+        self.processed_files = self._load_metadata()
+        self._pending_records = {}
+    
     def _load_metadata(self) -> dict:
         if os.path.exists(self.metadata_file):
             try:
@@ -25,30 +47,83 @@ class DocumentAutoLoader:
         with open(self.metadata_file, 'w') as f:
             json.dump(self.processed_files, f, indent=2)
     
-    def _get_file_hash(self, filepath: str) -> str:
+    def _get_file_hash(self, filepath: str, block_size: int = 1 << 20) -> str:
+        md5 = hashlib.md5()
         with open(filepath, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+            for block in iter(lambda: f.read(block_size), b""):
+                md5.update(block)
+        return md5.hexdigest()
+    
+    def _stat_record(self, filepath: str) -> dict:
+        stat = os.stat(filepath)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+    
+    def _stat_matches(self, entry, record: dict) -> bool:
+        return isinstance(entry, dict) and all(entry.get(key) == record[key] for key in ("size", "mtime_ns", "inode"))
+    
+    def _stored_hash(self, entry) -> Optional[str]:
+        if isinstance(entry, dict):
+            return entry.get("hash")
+        return entry
+    
+    def _check_file(self, filepath: str) -> Tuple[str, bool, Optional[dict]]:
+        entry = self.processed_files.get(filepath)
+        try:
+            record = self._stat_record(filepath)
+            if self._stat_matches(entry, record):
+                return filepath, False, None
+            record["hash"] = self._get_file_hash(filepath)
+        except OSError:
+            return filepath, False, None
+        return filepath, record["hash"] != self._stored_hash(entry), record
     
     def get_unprocessed_files(self) -> List[str]:
+        filepaths = self.get_all_docs_files()
+        if len(filepaths) >= self.parallel_scan_threshold and self.scan_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+                results = list(executor.map(self._check_file, filepaths))
+        else:
+            results = [self._check_file(filepath) for filepath in filepaths]
+        
         unprocessed = []
-        for ext in ['*.txt', '*.pdf']:
-            for filepath in Path(self.docs_folder).glob(ext):
-                filepath_str = str(filepath)
-                file_hash = self._get_file_hash(filepath_str)
-                if filepath_str not in self.processed_files or \
-                   self.processed_files[filepath_str] != file_hash:
-                    unprocessed.append(filepath_str)
+        refreshed = False
+        for filepath, changed, record in results:
+            if changed:
+                unprocessed.append(filepath)
+                self._pending_records[filepath] = record
+            elif record is not None:
+                self.processed_files[filepath] = record
+                refreshed = True
+        if refreshed:
+            self._save_metadata()
         return unprocessed
     
     def mark_as_processed(self, filepaths: List[str]):
         for filepath in filepaths:
-            if os.path.exists(filepath):
-                self.processed_files[filepath] = self._get_file_hash(filepath)
+            record = self._pending_records.pop(filepath, None)
+            try:
+                if record is None or not self._stat_matches(record, self._stat_record(filepath)):
+                    record = self._stat_record(filepath)
+                    record["hash"] = self._get_file_hash(filepath)
+            except OSError:
+                continue
+            self.processed_files[filepath] = record
+        self._save_metadata()
+        self._notify_changed(filepaths)
+    
+    def get_deleted_files(self) -> List[str]:
+        return [filepath for filepath in self.processed_files if not os.path.exists(filepath)]
+    
+    def mark_as_removed(self, filepaths: List[str]):
+        for filepath in filepaths:
+            self.processed_files.pop(filepath, None)
+            self._pending_records.pop(filepath, None)
         self._save_metadata()
+        self._notify_changed(filepaths)
     
     def get_all_docs_files(self) -> List[str]:
         all_files = []
         for ext in ['*.txt', '*.pdf']:
-            all_files.extend([str(f) for f in Path(self.docs_folder).glob(ext)])
+            matches = Path(self.docs_folder).rglob(ext) if self.recursive else Path(self.docs_folder).glob(ext)
+            all_files.extend([str(f) for f in matches if f.is_file()])
         return all_files
-
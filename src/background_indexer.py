@@ -0,0 +1,147 @@
+import time
+import threading
+from typing import Dict, List, Optional
+from .auto_loader import DocumentAutoLoader
+from .document_processor import DocumentProcessor
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _DocsEventHandler(FileSystemEventHandler):
+
+    def __init__(self, indexer: "BackgroundIndexer"):
+        self.indexer = indexer
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+        if any(str(path).lower().endswith((".txt", ".pdf")) for path in paths):
+            self.indexer.notify()
+
+
+class BackgroundIndexer:
+
+    def __init__(
+        self,
+        vector_store_manager,
+        auto_loader: DocumentAutoLoader,
+        index_name: str = "faiss_index",
+        processor: Optional[DocumentProcessor] = None,
+        debounce_seconds: float = 2.0,
+        poll_interval: float = 10.0,
+        use_inotify: bool = True
+    ):
+        self.vector_store_manager = vector_store_manager
+        self.auto_loader = auto_loader
+        self.index_name = index_name
+        self.processor = processor or DocumentProcessor()
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and Observer is not None
+
+        self.last_run: Dict = {}
+        self.last_error: Optional[str] = None
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._last_event_time = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.use_inotify else "polling"
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self):
+        self._last_event_time = time.monotonic()
+        self._changed.set()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stop.clear()
+        if self.use_inotify:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_DocsEventHandler(self), self.auto_loader.docs_folder, recursive=self.auto_loader.recursive)
+                self._observer.start()
+            except OSError:
+                self._observer = None
+                self.use_inotify = False
+        self._thread = threading.Thread(target=self._run, name="background-indexer", daemon=True)
+        self._thread.start()
+        self.notify()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._changed.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout)
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            triggered = self._changed.wait(None if self.use_inotify else self.poll_interval)
+            if self._stop.is_set():
+                break
+            if triggered:
+                while time.monotonic() - self._last_event_time < self.debounce_seconds:
+                    if self._stop.wait(self.debounce_seconds):
+                        return
+            self._changed.clear()
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def run_once(self) -> Dict:
+        self.auto_loader.reload()
+        unprocessed = self.auto_loader.get_unprocessed_files()
+        deleted = self.auto_loader.get_deleted_files()
+        if not unprocessed and not deleted:
+            return {}
+
+        start = time.perf_counter()
+        added = removed = 0
+        indexed: List[str] = []
+        manager = self.vector_store_manager
+        for file_path in unprocessed:
+            try:
+                documents = self.processor.process_document(file_path)
+            except (OSError, ValueError):
+                continue
+            vectors = manager.embed_new_chunks(file_path, documents)
+            stats = manager.upsert_file(file_path, documents, vectors)
+            added += stats["added"]
+            removed += stats["removed"]
+            indexed.append(file_path)
+        for file_path in deleted:
+            removed += manager.delete_file(file_path)
+        if manager.vector_store is not None:
+            manager.save(self.index_name)
+
+        self.auto_loader.mark_as_processed(indexed)
+        self.auto_loader.mark_as_removed(deleted)
+        self.last_run = {
+            "timestamp": time.time(),
+            "files_indexed": len(indexed),
+            "files_removed": len(deleted),
+            "chunks_added": added,
+            "chunks_removed": removed,
+            "duration_seconds": time.perf_counter() - start
+        }
+        return self.last_run
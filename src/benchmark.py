@@ -0,0 +1,446 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from .bm25_index import tokenize
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ("ingestion", "index_build", "persistence", "similarity_search", "batch_similarity_search", "highlighting", "query")
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "pen", "dar", "gul", "tor", "ble", "fin", "qua", "zen")
+
+
+class HashingEmbeddings(Embeddings):
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokenize(text)), dtype=np.int64)
+        if len(hashes):
+            signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(vector, (hashes >> 1) % self.dimension, signs)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+class StubLLM(LLM):
+    latency_ms: float = 0.0
+    confidence: int = 85
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-stub"
+
+    def _answer(self, prompt: str) -> str:
+        if "rate the confidence level" in prompt.lower():
+            return str(self.confidence)
+        match = re.search(r"\[Source 1[^\]]*\]\n([^\n]+)", prompt)
+        sentence = match.group(1).split(". ")[0].strip() if match else "The context does not contain enough information"
+        answer = f"{sentence}. [Source 1]"
+        if 'Confidence: N' in prompt:
+            answer += f"\nConfidence: {self.confidence}"
+        return answer
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._answer(prompt)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        words = self._call(prompt, stop, run_manager, **kwargs).split(" ")
+        for i, word in enumerate(words):
+            yield GenerationChunk(text=word if i == 0 else " " + word)
+
+
+class SyntheticCorpus:
+
+    def __init__(
+        self,
+        num_chunks: int,
+        chunk_words: int = 120,
+        vocabulary_size: int = 20000,
+        chunks_per_document: int = 50,
+        zipf_exponent: float = 1.1,
+        seed: int = 0
+    ):
+        if num_chunks <= 0:
+            raise ValueError("num_chunks must be positive")
+        self.num_chunks = num_chunks
+        self.chunk_words = chunk_words
+        self.chunks_per_document = chunks_per_document
+        self.seed = seed
+        rng = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+        self.vocabulary = sorted(words)
+        rng.shuffle(self.vocabulary)
+        weights = 1.0 / np.arange(1, vocabulary_size + 1) ** zipf_exponent
+        self.cum_weights = np.cumsum(weights).tolist()
+
+    @property
+    def num_documents(self) -> int:
+        return -(-self.num_chunks // self.chunks_per_document)
+
+    def chunk_words_at(self, index: int) -> List[str]:
+        rng = random.Random(self.seed * 1000003 + index)
+        return rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=self.chunk_words)
+
+    def chunk_text(self, index: int) -> str:
+        words = self.chunk_words_at(index)
+        sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+        return " ".join(sentences)
+
+    def source(self, index: int) -> str:
+        return f"synthetic_{index // self.chunks_per_document:07d}.txt"
+
+    def chunk(self, index: int) -> Document:
+        first = index - index % self.chunks_per_document
+        return Document(
+            page_content=self.chunk_text(index),
+            metadata={
+                "source": self.source(index),
+                "file_path": os.path.join("synthetic", self.source(index)),
+                "chunk_id": index % self.chunks_per_document,
+                "total_chunks": min(self.chunks_per_document, self.num_chunks - first)
+            }
+        )
+
+    def batches(self, batch_size: int = 50000) -> Iterator[List[Document]]:
+        for start in range(0, self.num_chunks, batch_size):
+            yield [self.chunk(i) for i in range(start, min(start + batch_size, self.num_chunks))]
+
+    def questions(self, count: int, terms: int = 10) -> List[Dict]:
+        rng = random.Random(self.seed + 7919)
+        rank = {word: i for i, word in enumerate(self.vocabulary)}
+        items = []
+        for index in rng.sample(range(self.num_chunks), min(count, self.num_chunks)):
+            words = sorted(set(self.chunk_words_at(index)), key=lambda word: -rank[word])[:terms]
+            items.append({
+                "question": f"What does the document say about {' '.join(words)}?",
+                "relevant_doc_ids": [self.source(index) + str(index % self.chunks_per_document)]
+            })
+        return items
+
+    def write_documents(self, directory: str, count: int) -> List[str]:
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for document in range(min(count, self.num_documents)):
+            first = document * self.chunks_per_document
+            last = min(first + self.chunks_per_document, self.num_chunks)
+            path = os.path.join(directory, self.source(first))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(self.chunk_text(i) for i in range(first, last)))
+            paths.append(path)
+        return paths
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def latency_summary(latencies: List[float], elapsed: float) -> Dict:
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+        "max_ms": float(values.max()),
+        "throughput_per_s": len(values) / elapsed if elapsed > 0 else None
+    }
+
+
+def measure(run: Callable[[Any], Any], items: List, warmup: int = 0) -> Dict:
+    for item in items[:warmup]:
+        run(item)
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        run(item)
+        latencies.append(time.perf_counter() - item_start)
+    stats = latency_summary(latencies, time.perf_counter() - start)
+    stats["rss_mb"] = current_rss_mb()
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return stats
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(config: Dict) -> Dict:
+    from .vector_store_ollama import VectorStoreManager
+    from .rag_pipeline_ollama import RAGPipeline
+    from .document_processor import DocumentProcessor
+    from .context_packer import ContextPacker
+    from .rag_evaluator import RAGEvaluator
+
+    stages = set(config["stages"])
+    corpus = SyntheticCorpus(
+        config["chunks"],
+        chunk_words=config["chunk_words"],
+        vocabulary_size=config["vocabulary"],
+        seed=config["seed"]
+    )
+    questions = corpus.questions(config["questions"])
+    embeddings = HashingEmbeddings(config["dimension"])
+    workdir = tempfile.mkdtemp(prefix="rag_benchmark_")
+    results = {
+        "chunks": config["chunks"],
+        "documents": corpus.num_documents,
+        "questions": len(questions),
+        "stages": {}
+    }
+
+    try:
+        if "ingestion" in stages:
+            paths = corpus.write_documents(os.path.join(workdir, "docs"), config["ingest_documents"])
+            processor = DocumentProcessor()
+            start = time.perf_counter()
+            chunks = sum(len(batch) for batch in processor.iter_document_batches(paths, max_workers=config["ingest_workers"]))
+            elapsed = time.perf_counter() - start
+            stage = latency_summary(list(processor.file_timings.values()), elapsed)
+            stage.update({"files": len(paths), "chunks": chunks, "chunks_per_s": chunks / elapsed if elapsed > 0 else None, "peak_rss_mb": peak_rss_mb()})
+            results["stages"]["ingestion"] = stage
+
+        manager = VectorStoreManager(
+            persist_directory=os.path.join(workdir, "vector_store"),
+            use_embedding_cache=False,
+            embeddings=embeddings,
+            index_type=config["index_type"],
+            nprobe=config["nprobe"],
+            ef_search=config["ef_search"],
+            use_mmap=config["mmap"],
+            search_mode=config["mode"],
+            quantization=config["quantization"],
+            rescore_factor=config["rescore_factor"]
+        )
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        for batch in corpus.batches(config["build_batch"]):
+            if manager.vector_store is None:
+                manager.create_vector_store(batch)
+            else:
+                manager.add_documents(batch)
+        build_seconds = time.perf_counter() - start
+        approximate = config["index_type"] != "flat" or config["quantization"] != "none"
+        index_stats = manager.get_stats(evaluate_recall=approximate, recall_k=10)
+        rss_after = current_rss_mb()
+        results["stages"]["index_build"] = {
+            "build_seconds": build_seconds,
+            "vectors_per_s": config["chunks"] / build_seconds if build_seconds > 0 else None,
+            "index_type": index_stats["index_type"],
+            "index_bytes": index_stats["index_bytes"],
+            "quantization": index_stats["quantization"],
+            "quantized_memory": index_stats["quantized_memory"],
+            "exact_recall_at_10": index_stats["recall"].get("recall_at_k") if approximate else 1.0,
+            "chunk_store_bytes": index_stats["chunk_store_bytes"],
+            "rss_growth_mb": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+        if "persistence" in stages:
+            start = time.perf_counter()
+            manager.save("benchmark_index")
+            save_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            manager.load("benchmark_index")
+            results["stages"]["persistence"] = {
+                "save_seconds": save_seconds,
+                "load_seconds": time.perf_counter() - start,
+                "storage": manager.get_stats()["storage"],
+                "peak_rss_mb": peak_rss_mb()
+            }
+
+        k = config["k"]
+        warmup = min(config["warmup"], len(questions))
+        retrieved = {}
+
+        def search(item: Dict):
+            retrieved[item["question"]] = manager.similarity_search(item["question"], k=k)
+
+        search_stage = measure(search, questions, warmup)
+        if "similarity_search" in stages:
+            ranked = [retrieved[item["question"]] for item in questions]
+            quality = RAGEvaluator().batch_retrieval_metrics(ranked, [item["relevant_doc_ids"] for item in questions], ks=sorted({1, k}))
+            search_stage.update({"k": k, "mode": config["mode"], "recall_at_k": quality["recall_at_k"][k], "mrr": quality["mrr_at_k"][k]})
+            results["stages"]["similarity_search"] = search_stage
+
+        if "batch_similarity_search" in stages:
+            batch_size = config["search_batch"]
+            batches = [[item["question"] for item in questions[i:i + batch_size]] for i in range(0, len(questions), batch_size)]
+            stage = measure(lambda batch: manager.batch_similarity_search(batch, k=k), batches, min(warmup, len(batches)))
+            stage["batch_size"] = batch_size
+            stage["queries_per_s"] = stage["throughput_per_s"] * batch_size if stage.get("throughput_per_s") else None
+            results["stages"]["batch_similarity_search"] = stage
+
+        pipeline = RAGPipeline(
+            embeddings=embeddings,
+            llm=StubLLM(latency_ms=config["llm_latency_ms"]),
+            context_packer=ContextPacker(max_tokens=config["context_budget"]) if config["context_budget"] > 0 else None
+        )
+
+        if "highlighting" in stages:
+            def highlight(item: Dict):
+                docs = retrieved[item["question"]]
+                answer = pipeline.llm.invoke(pipeline.rag_prompt.format(
+                    context=pipeline.format_documents(docs),
+                    question=item["question"],
+                    conversation_history=""
+                ))
+                pipeline.highlighter.highlight_batch([doc.page_content[:500] for doc, _ in docs], answer)
+
+            stage = measure(highlight, questions, warmup)
+            stage["sources_per_query"] = k
+            results["stages"]["highlighting"] = stage
+
+        if "query" in stages:
+            def query(item: Dict):
+                pipeline.resolve_confidence(pipeline.query(item["question"], retrieved[item["question"]], strategy=config["strategy"]))
+
+            stage = measure(query, questions, warmup)
+            stage.update({"strategy": config["strategy"], "llm_latency_ms": config["llm_latency_ms"], "context_budget": config["context_budget"]})
+            results["stages"]["query"] = stage
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    lines = []
+    previous = {run["chunks"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        base = previous.get(run["chunks"])
+        if base is None:
+            continue
+        for name, stage in run["stages"].items():
+            base_stage = base["stages"].get(name, {})
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "build_seconds", "peak_rss_mb"):
+                if stage.get(metric) and base_stage.get(metric):
+                    change = stage[metric] / base_stage[metric] - 1
+                    lines.append(f"{run['chunks']:>9} {name:<24} {metric:<14} {base_stage[metric]:>12.2f} -> {stage[metric]:>12.2f} ({change:+.1%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval, highlighting and answering on a synthetic corpus")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000], help="Corpus sizes to benchmark, each in a fresh process")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--mode", default="dense", choices=["dense", "hybrid"])
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--quantization", default="none", choices=["none", "int8", "binary"])
+    parser.add_argument("--rescore-factor", type=float, default=None, help="Candidates rescored with full-precision vectors per result (quantized indexes)")
+    parser.add_argument("--mmap", action="store_true", help="Reload the saved index memory-mapped in the persistence stage")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--chunk-words", type=int, default=120)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--build-batch", type=int, default=50000)
+    parser.add_argument("--search-batch", type=int, default=32)
+    parser.add_argument("--ingest-documents", type=int, default=200, help="Synthetic files written and chunked in the ingestion stage")
+    parser.add_argument("--ingest-workers", type=int, default=None)
+    parser.add_argument("--strategy", default="sequential", choices=["sequential", "fused", "async"])
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each stub LLM call")
+    parser.add_argument("--context-budget", type=int, default=1500, help="Context packing token budget (0 disables packing)")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    base_config = {key: value for key, value in vars(args).items() if key not in ("chunks", "output", "baseline")}
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": base_config,
+        "runs": []
+    }
+    context = multiprocessing.get_context("spawn")
+    for chunks in args.chunks:
+        print(f"Benchmarking {chunks} chunks...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            run = executor.submit(run_benchmark, dict(base_config, chunks=chunks)).result()
+        report["runs"].append(run)
+        for name, stage in run["stages"].items():
+            if "p50_ms" in stage:
+                print(f"  {name:<24} p50 {stage['p50_ms']:9.2f} ms  p95 {stage['p95_ms']:9.2f} ms  p99 {stage['p99_ms']:9.2f} ms")
+            elif "build_seconds" in stage:
+                print(f"  {name:<24} {stage['build_seconds']:.2f} s, {stage['index_bytes'] / (1024 * 1024):.1f} MB index")
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            for line in compare(report, json.load(f)):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
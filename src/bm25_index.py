@@ -0,0 +1,119 @@
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-./]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+class BM25Index:
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self.doc_lengths:
+                self.remove([doc_id])
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            length = sum(counts.values())
+            self.doc_lengths[doc_id] = length
+            self.doc_terms[doc_id] = list(counts)
+            self.total_length += length
+
+    def remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            if doc_id not in self.doc_lengths:
+                continue
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            for term in self.doc_terms.pop(doc_id):
+                posting = self.postings[term]
+                del posting[doc_id]
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        num_docs = len(self.doc_lengths)
+        if num_docs == 0:
+            return []
+        avg_length = self.total_length / num_docs
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def copy(self) -> "BM25Index":
+        index = BM25Index(self.k1, self.b)
+        index.postings = {term: dict(posting) for term, posting in self.postings.items()}
+        index.doc_lengths = dict(self.doc_lengths)
+        index.doc_terms = dict(self.doc_terms)
+        index.total_length = self.total_length
+        return index
+
+    def reset(self):
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "doc_lengths": self.doc_lengths, "postings": self.postings}, f)
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.k1 = data["k1"]
+            self.b = data["b"]
+            self.doc_lengths = data["doc_lengths"]
+            self.postings = data["postings"]
+            self.total_length = sum(self.doc_lengths.values())
+            self.doc_terms = {}
+            for term, posting in self.postings.items():
+                for doc_id in posting:
+                    self.doc_terms.setdefault(doc_id, []).append(term)
+            return True
+        except:
+            self.reset()
+            return False
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
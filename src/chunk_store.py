@@ -0,0 +1,235 @@
+import os
+import json
+import sqlite3
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+CHUNK_STORE_FILE = "chunks.sqlite"
+INDEX_FILE = "index.faiss"
+
+
+class ChunkStore(Docstore, AddableMixin):
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.source_ids = array("i")
+        self.file_path_ids = array("i")
+        self.chunk_ids = array("q")
+        self.total_chunks = array("q")
+        self.text = bytearray()
+        self.text_offsets = array("q", [0])
+        self.extra: Dict[int, Dict] = {}
+
+    @classmethod
+    def from_documents(cls, documents: Dict[str, Document]) -> "ChunkStore":
+        store = cls()
+        store.add(documents)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.rows
+
+    def _intern(self, value) -> int:
+        if not isinstance(value, str):
+            return -1
+        if value not in self.string_ids:
+            self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return self.string_ids[value]
+
+    def _append(self, doc_id: str, doc: Document):
+        metadata = dict(doc.metadata)
+        source = metadata.pop("source", None)
+        file_path = metadata.pop("file_path", None)
+        chunk_id = metadata.pop("chunk_id", None)
+        total_chunks = metadata.pop("total_chunks", None)
+
+        row = len(self.ids)
+        self.source_ids.append(self._intern(source))
+        self.file_path_ids.append(self._intern(file_path))
+        self.chunk_ids.append(chunk_id if type(chunk_id) is int and chunk_id >= 0 else -1)
+        self.total_chunks.append(total_chunks if type(total_chunks) is int and total_chunks >= 0 else -1)
+        for key, value, stored in (("source", source, self.source_ids[row]), ("file_path", file_path, self.file_path_ids[row]),
+                                   ("chunk_id", chunk_id, self.chunk_ids[row]), ("total_chunks", total_chunks, self.total_chunks[row])):
+            if value is not None and stored == -1:
+                metadata[key] = value
+        if metadata:
+            self.extra[row] = metadata
+
+        self.text.extend(doc.page_content.encode("utf-8"))
+        self.text_offsets.append(len(self.text))
+        self.ids.append(doc_id)
+        self.rows[doc_id] = row
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self.rows)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, doc in texts.items():
+            self._append(doc_id, doc)
+
+    def delete(self, ids: List) -> None:
+        overlapping = set(ids).intersection(self.rows)
+        if not overlapping:
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for doc_id in overlapping:
+            self.extra.pop(self.rows.pop(doc_id), None)
+        if len(self.ids) > 1024 and len(self.rows) * 2 < len(self.ids):
+            self.compact()
+
+    def document(self, row: int) -> Document:
+        metadata = {}
+        if self.source_ids[row] != -1:
+            metadata["source"] = self.strings[self.source_ids[row]]
+        if self.file_path_ids[row] != -1:
+            metadata["file_path"] = self.strings[self.file_path_ids[row]]
+        if self.chunk_ids[row] != -1:
+            metadata["chunk_id"] = self.chunk_ids[row]
+        if self.total_chunks[row] != -1:
+            metadata["total_chunks"] = self.total_chunks[row]
+        if row in self.extra:
+            metadata.update(self.extra[row])
+        text = self.text[self.text_offsets[row]:self.text_offsets[row + 1]].decode("utf-8")
+        return Document(id=self.ids[row], page_content=text, metadata=metadata)
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self.rows.get(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self.document(row)
+
+    def items(self) -> Iterable:
+        for doc_id, row in self.rows.items():
+            yield doc_id, self.document(row)
+
+    def copy(self) -> "ChunkStore":
+        store = ChunkStore()
+        store.ids = list(self.ids)
+        store.rows = dict(self.rows)
+        store.strings = list(self.strings)
+        store.string_ids = dict(self.string_ids)
+        store.source_ids = array("i", self.source_ids)
+        store.file_path_ids = array("i", self.file_path_ids)
+        store.chunk_ids = array("q", self.chunk_ids)
+        store.total_chunks = array("q", self.total_chunks)
+        store.text = bytearray(self.text)
+        store.text_offsets = array("q", self.text_offsets)
+        store.extra = {row: dict(metadata) for row, metadata in self.extra.items()}
+        return store
+
+    def compact(self):
+        if len(self.rows) == len(self.ids):
+            return
+        compacted = ChunkStore()
+        compacted.strings = self.strings
+        compacted.string_ids = self.string_ids
+        for row in sorted(self.rows.values()):
+            start, end = self.text_offsets[row], self.text_offsets[row + 1]
+            new_row = len(compacted.ids)
+            compacted.ids.append(self.ids[row])
+            compacted.rows[self.ids[row]] = new_row
+            compacted.source_ids.append(self.source_ids[row])
+            compacted.file_path_ids.append(self.file_path_ids[row])
+            compacted.chunk_ids.append(self.chunk_ids[row])
+            compacted.total_chunks.append(self.total_chunks[row])
+            compacted.text.extend(self.text[start:end])
+            compacted.text_offsets.append(len(compacted.text))
+            if row in self.extra:
+                compacted.extra[new_row] = self.extra[row]
+        self.__dict__.update(compacted.__dict__)
+
+    def memory_bytes(self) -> int:
+        columns = (self.source_ids, self.file_path_ids, self.chunk_ids, self.total_chunks, self.text_offsets)
+        return len(self.text) + sum(column.itemsize * len(column) for column in columns)
+
+    def save(self, path: str, positions: List[str]):
+        self.compact()
+        columns = {
+            "ids": "\n".join(self.ids).encode("utf-8"),
+            "strings": json.dumps(self.strings).encode("utf-8"),
+            "source_ids": self.source_ids.tobytes(),
+            "file_path_ids": self.file_path_ids.tobytes(),
+            "chunk_ids": self.chunk_ids.tobytes(),
+            "total_chunks": self.total_chunks.tobytes(),
+            "text": bytes(self.text),
+            "text_offsets": self.text_offsets.tobytes(),
+            "extra": json.dumps({str(row): metadata for row, metadata in self.extra.items()}).encode("utf-8"),
+            "positions": array("q", [self.rows[doc_id] for doc_id in positions]).tobytes()
+        }
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("CREATE TABLE columns (name TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            conn.executemany("INSERT INTO columns (name, data) VALUES (?, ?)", columns.items())
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["ChunkStore", Dict[int, str]]:
+        conn = sqlite3.connect(path)
+        try:
+            columns = dict(conn.execute("SELECT name, data FROM columns").fetchall())
+        finally:
+            conn.close()
+
+        store = cls()
+        store.ids = columns["ids"].decode("utf-8").split("\n") if columns["ids"] else []
+        store.rows = {doc_id: row for row, doc_id in enumerate(store.ids)}
+        store.strings = json.loads(columns["strings"])
+        store.string_ids = {value: i for i, value in enumerate(store.strings)}
+        store.source_ids.frombytes(columns["source_ids"])
+        store.file_path_ids.frombytes(columns["file_path_ids"])
+        store.chunk_ids.frombytes(columns["chunk_ids"])
+        store.total_chunks.frombytes(columns["total_chunks"])
+        store.text = bytearray(columns["text"])
+        store.text_offsets = array("q")
+        store.text_offsets.frombytes(columns["text_offsets"])
+        store.extra = {int(row): metadata for row, metadata in json.loads(columns["extra"]).items()}
+        positions = array("q")
+        positions.frombytes(columns["positions"])
+        return store, {i: store.ids[row] for i, row in enumerate(positions)}
+
+
+def as_chunk_store(docstore) -> ChunkStore:
+    if isinstance(docstore, ChunkStore):
+        return docstore.copy()
+    return ChunkStore.from_documents(dict(docstore._dict))
+
+
+def save_faiss_store(vector_store: FAISS, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    if not isinstance(vector_store.docstore, ChunkStore):
+        vector_store.docstore = as_chunk_store(vector_store.docstore)
+    positions = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    tmp_index = os.path.join(directory, INDEX_FILE + ".tmp")
+    faiss.write_index(vector_store.index, tmp_index)
+    vector_store.docstore.save(os.path.join(directory, CHUNK_STORE_FILE), positions)
+    os.replace(tmp_index, os.path.join(directory, INDEX_FILE))
+
+
+def load_faiss_store(directory: str, embeddings: Embeddings) -> Optional[FAISS]:
+    chunk_path = os.path.join(directory, CHUNK_STORE_FILE)
+    if not os.path.exists(chunk_path):
+        return None
+    docstore, index_to_docstore_id = ChunkStore.load(chunk_path)
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.read_index(os.path.join(directory, INDEX_FILE)),
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
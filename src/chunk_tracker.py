@@ -0,0 +1,125 @@
+import os
+import json
+import uuid
+import hashlib
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from .faiss_utils import delete_from_store
+
+
+class ChunkTracker:
+
+    def __init__(self):
+        self.files: Dict[str, List[List[str]]] = {}
+
+    @staticmethod
+    def chunk_hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def file_key(document: Document) -> str:
+        return document.metadata.get("file_path") or document.metadata.get("source", "Unknown")
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r") as f:
+                self.files = json.load(f)
+            return True
+        except:
+            self.files = {}
+            return False
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.files, f)
+
+    def reset(self):
+        self.files = {}
+
+    def rebuild_from_store(self, vector_store):
+        self.files = {}
+        for doc_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                self.files.setdefault(self.file_key(doc), []).append([doc_id, self.chunk_hash(doc.page_content)])
+
+    def register(self, ids: List[str], documents: List[Document]):
+        for doc_id, doc in zip(ids, documents):
+            self.files.setdefault(self.file_key(doc), []).append([doc_id, self.chunk_hash(doc.page_content)])
+
+    def _owned_key(self, file_path: str) -> Optional[str]:
+        if file_path in self.files:
+            return file_path
+        legacy_key = os.path.basename(file_path)
+        if legacy_key in self.files:
+            return legacy_key
+        return None
+
+    def file_ids(self, file_path: str) -> List[str]:
+        key = self._owned_key(file_path)
+        return [doc_id for doc_id, _ in self.files.get(key, [])] if key else []
+
+    def new_chunks(self, file_path: str, documents: List[Document]) -> List[Document]:
+        key = self._owned_key(file_path)
+        known = {chunk_hash for _, chunk_hash in self.files.get(key, [])} if key else set()
+        return [doc for doc in documents if self.chunk_hash(doc.page_content) not in known]
+
+    def upsert(self, vector_store, file_path: str, documents: List[Document], vectors: Optional[Dict[str, List[float]]] = None) -> dict:
+        key = self._owned_key(file_path)
+        available: Dict[str, List[str]] = {}
+        for doc_id, chunk_hash in self.files.get(key, []) if key else []:
+            available.setdefault(chunk_hash, []).append(doc_id)
+
+        entries = []
+        new_docs = []
+        new_ids = []
+        kept = 0
+        for doc in documents:
+            chunk_hash = self.chunk_hash(doc.page_content)
+            if available.get(chunk_hash):
+                doc_id = available[chunk_hash].pop(0)
+                existing = vector_store.docstore.search(doc_id)
+                if isinstance(existing, Document) and existing.metadata != doc.metadata:
+                    vector_store.docstore.delete([doc_id])
+                    vector_store.docstore.add({doc_id: Document(id=doc_id, page_content=existing.page_content, metadata=dict(doc.metadata))})
+                kept += 1
+            else:
+                doc_id = str(uuid.uuid4())
+                new_docs.append(doc)
+                new_ids.append(doc_id)
+            entries.append([doc_id, chunk_hash])
+
+        stale_ids = [doc_id for ids in available.values() for doc_id in ids]
+        if stale_ids:
+            delete_from_store(vector_store, stale_ids)
+        if new_docs:
+            hashes = [self.chunk_hash(doc.page_content) for doc in new_docs]
+            if vectors is not None and all(chunk_hash in vectors for chunk_hash in hashes):
+                vector_store.add_embeddings(
+                    [(doc.page_content, vectors[chunk_hash]) for doc, chunk_hash in zip(new_docs, hashes)],
+                    metadatas=[doc.metadata for doc in new_docs],
+                    ids=new_ids
+                )
+            else:
+                vector_store.add_documents(new_docs, ids=new_ids)
+
+        if key and key != file_path:
+            del self.files[key]
+        if entries:
+            self.files[file_path] = entries
+        else:
+            self.files.pop(file_path, None)
+
+        return {"added": len(new_ids), "removed": len(stale_ids), "kept": kept}
+
+    def remove(self, vector_store, file_path: str) -> int:
+        key = self._owned_key(file_path)
+        if key is None:
+            return 0
+        stale_ids = [doc_id for doc_id, _ in self.files.pop(key)]
+        if stale_ids:
+            delete_from_store(vector_store, stale_ids)
+        return len(stale_ids)
@@ -0,0 +1,200 @@
+import re
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from .bm25_index import tokenize
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def approximate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def default_token_counter() -> Callable[[str], int]:
+    if tiktoken is None:
+        return approximate_tokens
+    try:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except:
+        return approximate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def overlap_length(previous: str, current: str, min_overlap: int = 20, max_overlap: int = 400) -> int:
+    if len(current) < min_overlap:
+        return 0
+    tail = previous[-max_overlap:]
+    probe = current[:min_overlap]
+    start = tail.find(probe)
+    while start != -1:
+        if current.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def split_sentences(text: str) -> List[str]:
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    spans = []
+    start = 0
+    for boundary in list(SENTENCE_BOUNDARY.finditer(text)) + [None]:
+        end = boundary.start() if boundary else len(text)
+        segment = text[start:end]
+        if segment.strip():
+            left = start + len(segment) - len(segment.lstrip())
+            spans.append((left, start + len(segment.rstrip())))
+        if boundary:
+            start = boundary.end()
+    return spans
+
+
+class ContextPacker:
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        token_counter: Optional[Callable[[str], int]] = None,
+        min_overlap: int = 20,
+        max_overlap: int = 400,
+        rank_weight: float = 0.5
+    ):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.count_tokens = token_counter or default_token_counter()
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.rank_weight = rank_weight
+
+    @staticmethod
+    def _header(position: int, doc: Document) -> str:
+        return f"[Source {position}: {doc.metadata.get('source', 'Unknown')}]\n"
+
+    @staticmethod
+    def _with_content(doc: Document, content: str) -> Document:
+        return Document(page_content=content, metadata=dict(doc.metadata), id=getattr(doc, "id", None))
+
+    def _context_tokens(self, docs: List[Tuple[Document, float]]) -> int:
+        return sum(self.count_tokens(self._header(i, doc) + doc.page_content + "\n") for i, (doc, _) in enumerate(docs, 1))
+
+    def remove_overlaps(self, retrieved_docs: List[Tuple[Document, float]]) -> Tuple[List[str], int]:
+        texts = [doc.page_content for doc, _ in retrieved_docs]
+        positions = {}
+        for i, (doc, _) in enumerate(retrieved_docs):
+            chunk_id = doc.metadata.get("chunk_id")
+            if isinstance(chunk_id, int):
+                positions[(doc.metadata.get("source"), chunk_id)] = i
+        removed = 0
+        for (source, chunk_id), i in positions.items():
+            previous = positions.get((source, chunk_id - 1))
+            if previous is None:
+                continue
+            length = overlap_length(retrieved_docs[previous][0].page_content, texts[i], self.min_overlap, self.max_overlap)
+            if length:
+                texts[i] = texts[i][length:].lstrip()
+                removed += length
+        return texts, removed
+
+    def _score_sentences(self, question: str, sentence_groups: List[List[str]]) -> List[List[float]]:
+        query_terms = set(tokenize(question))
+        sentence_terms = [[set(tokenize(sentence)) for sentence in group] for group in sentence_groups]
+        num_sentences = sum(len(group) for group in sentence_groups) or 1
+        document_frequency: Dict[str, int] = {}
+        for group in sentence_terms:
+            for terms in group:
+                for term in terms & query_terms:
+                    document_frequency[term] = document_frequency.get(term, 0) + 1
+        weights = {term: math.log(1 + num_sentences / count) for term, count in document_frequency.items()}
+        total_weight = sum(weights.values()) or 1.0
+
+        scores = []
+        for rank, group in enumerate(sentence_terms):
+            prior = self.rank_weight / (rank + 1)
+            scores.append([sum(weights.get(term, 0.0) for term in terms) / total_weight + prior for terms in group])
+        return scores
+
+    def pack(self, question: str, retrieved_docs: List[Tuple[Document, float]]) -> Tuple[List[Tuple[Document, float]], Dict]:
+        tokens_before = self._context_tokens(retrieved_docs)
+        texts, overlap_chars = self.remove_overlaps(retrieved_docs)
+        deduplicated = [
+            (self._with_content(doc, text), score)
+            for (doc, score), text in zip(retrieved_docs, texts)
+            if text.strip()
+        ] if overlap_chars else list(retrieved_docs)
+        tokens_deduplicated = self._context_tokens(deduplicated) if overlap_chars else tokens_before
+        if tokens_deduplicated <= self.max_tokens:
+            return deduplicated, {
+                "budget_tokens": self.max_tokens,
+                "tokens_before": tokens_before,
+                "tokens_after": tokens_deduplicated,
+                "tokens_saved": tokens_before - tokens_deduplicated,
+                "overlap_chars_removed": overlap_chars,
+                "sentences_total": None,
+                "sentences_kept": None,
+                "chunks_kept": len(deduplicated),
+                "chunks_total": len(retrieved_docs)
+            }
+
+        span_groups = [sentence_spans(text) for text in texts]
+        seen = set()
+        for text, spans in zip(texts, span_groups):
+            unique = []
+            for start, end in spans:
+                key = " ".join(text[start:end].lower().split())
+                if key not in seen:
+                    seen.add(key)
+                    unique.append((start, end))
+            spans[:] = unique
+        sentence_groups = [[text[start:end] for start, end in spans] for text, spans in zip(texts, span_groups)]
+        scores = self._score_sentences(question, sentence_groups)
+
+        candidates = sorted(
+            ((score, i, j) for i, group_scores in enumerate(scores) for j, score in enumerate(group_scores)),
+            key=lambda item: (-item[0], item[1], item[2])
+        )
+        selected: Dict[int, set] = {}
+        used = 0
+        for score, i, j in candidates:
+            cost = self.count_tokens(sentence_groups[i][j]) + 1
+            if i not in selected:
+                cost += self.count_tokens(self._header(len(selected) + 1, retrieved_docs[i][0]))
+            if used + cost > self.max_tokens:
+                continue
+            selected.setdefault(i, set()).add(j)
+            used += cost
+
+        packed = []
+        for i, (doc, score) in enumerate(retrieved_docs):
+            if i not in selected:
+                continue
+            runs = []
+            for j in sorted(selected[i]):
+                start, end = span_groups[i][j]
+                if runs and j - 1 in selected[i]:
+                    runs[-1][1] = end
+                else:
+                    runs.append([start, end])
+            packed.append((self._with_content(doc, "\n".join(texts[i][start:end] for start, end in runs)), score))
+
+        tokens_after = self._context_tokens(packed)
+        stats = {
+            "budget_tokens": self.max_tokens,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "overlap_chars_removed": overlap_chars,
+            "sentences_total": sum(len(group) for group in sentence_groups),
+            "sentences_kept": sum(len(kept) for kept in selected.values()),
+            "chunks_kept": len(packed),
+            "chunks_total": len(retrieved_docs)
+        }
+        return packed, stats
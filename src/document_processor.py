@@ -1,8 +1,23 @@
 import os
-from typing import List
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
 from PyPDF2 import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from .telemetry import get_telemetry, span
+
+_worker_processors: Dict[Tuple[int, int], "DocumentProcessor"] = {}
+
+def _process_file_worker(file_path: str, chunk_size: int, chunk_overlap: int) -> Tuple[str, List[Document], float]:
+    processor = _worker_processors.get((chunk_size, chunk_overlap))
+    if processor is None:
+        processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        _worker_processors[(chunk_size, chunk_overlap)] = processor
+    start = time.perf_counter()
+    documents = processor.process_document(file_path)
+    return file_path, documents, time.perf_counter() - start
 
 class DocumentProcessor:
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
@@ -14,13 +29,11 @@ class DocumentProcessor:
             length_function=len,
             separators=["\n\n", "\n", " ", ""]
         )
+        self.file_timings: Dict[str, float] = {}
     
     def load_pdf(self, file_path: str) -> str:
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        return "".join((page.extract_text() or "") + "\n" for page in reader.pages)
     
     def load_text(self, file_path: str) -> str:
         with open(file_path, 'r', encoding='utf-8') as f:
@@ -28,33 +41,102 @@ class DocumentProcessor:
     
     def process_document(self, file_path: str) -> List[Document]:
         file_ext = os.path.splitext(file_path)[1].lower()
-        if file_ext == '.pdf':
-            text = self.load_pdf(file_path)
-        elif file_ext == '.txt':
-            text = self.load_text(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_ext}")
-        
-        chunks = self.text_splitter.split_text(text)
-        documents = []
-        filename = os.path.basename(file_path)
-        
-        for i, chunk in enumerate(chunks):
-            doc = Document(
-                page_content=chunk,
-                metadata={
-                    "source": filename,
-                    "chunk_id": i,
-                    "total_chunks": len(chunks)
-                }
-            )
-            documents.append(doc)
-        return documents
+        with span("ingest.process_document", file_type=file_ext) as document_span:
+            with span("ingest.load"):
+                if file_ext == '.pdf':
+                    text = self.load_pdf(file_path)
+                elif file_ext == '.txt':
+                    text = self.load_text(file_path)
+                else:
+                    raise ValueError(f"Unsupported file type: {file_ext}")
+            
+            with span("ingest.split"):
+                chunks = self.text_splitter.split_text(text)
+            documents = []
+            filename = os.path.basename(file_path)
+            
+            for i, chunk in enumerate(chunks):
+                doc = Document(
+                    page_content=chunk,
+                    metadata={
+                        "source": filename,
+                        "file_path": file_path,
+                        "chunk_id": i,
+                        "total_chunks": len(chunks)
+                    }
+                )
+                documents.append(doc)
+            document_span.set(characters=len(text), chunks=len(documents))
+            get_telemetry().increment("rag_ingested_chunks_total", len(documents))
+            return documents
     
-    def process_multiple_documents(self, file_paths: List[str]) -> List[Document]:
+    def process_multiple_documents(self, file_paths: List[str], parallel: bool = False, max_workers: Optional[int] = None) -> List[Document]:
+        if parallel:
+            all_documents = []
+            for batch in self.iter_document_batches(file_paths, max_workers=max_workers):
+                all_documents.extend(batch)
+            return all_documents
+        
         all_documents = []
         for file_path in file_paths:
             docs = self.process_document(file_path)
             all_documents.extend(docs)
         return all_documents
-
+    
+    def iter_document_batches(self, file_paths: List[str], batch_size: int = 256, max_workers: Optional[int] = None, min_parallel_files: int = 4) -> Iterator[List[Document]]:
+        self.file_timings = {}
+        if max_workers is None:
+            max_workers = min(os.cpu_count() or 1, len(file_paths))
+        
+        completed = set()
+        batch = []
+        telemetry = get_telemetry()
+        
+        executor = None
+        futures = []
+        if max_workers > 1 and len(file_paths) >= min_parallel_files:
+            try:
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+                futures = [
+                    executor.submit(_process_file_worker, path, self.chunk_size, self.chunk_overlap)
+                    for path in file_paths
+                ]
+            except (BrokenProcessPool, OSError, NotImplementedError):
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                executor = None
+        
+        if executor is not None:
+            with executor:
+                try:
+                    for future in as_completed(futures):
+                        try:
+                            file_path, documents, elapsed = future.result()
+                        except BrokenProcessPool:
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            break
+                        self.file_timings[file_path] = elapsed
+                        telemetry.observe("ingest.process_document", elapsed)
+                        telemetry.increment("rag_ingested_chunks_total", len(documents))
+                        completed.add(file_path)
+                        batch.extend(documents)
+                        if len(batch) >= batch_size:
+                            yield batch
+                            batch = []
+                except BaseException:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        
+        for file_path in file_paths:
+            if file_path in completed:
+                continue
+            start = time.perf_counter()
+            documents = self.process_document(file_path)
+            self.file_timings[file_path] = time.perf_counter() - start
+            batch.extend(documents)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        
+        if batch:
+            yield batch
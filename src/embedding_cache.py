@@ -0,0 +1,166 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .telemetry import get_telemetry
+
+
+class EmbeddingCache:
+
+    def __init__(self, db_path: str = "vector_store/embedding_cache.sqlite", max_entries: int = 500000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model] + batch
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for text_hash, vector in items.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((model, text_hash, int(vector.shape[0]), vector.tobytes(), now))
+        with self._lock:
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            ).rowcount
+            if inserted < len(rows):
+                self._conn.executemany(
+                    "UPDATE embeddings SET dim = ?, vector = ?, last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(dim, blob, last_used, row_model, text_hash) for row_model, text_hash, dim, blob, last_used in rows]
+                )
+            self._count += inserted
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            self._count -= self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            ).rowcount
+
+    def clear(self, model: Optional[str] = None):
+        with self._lock:
+            if model is None:
+                self._conn.execute("DELETE FROM embeddings")
+            else:
+                self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,))
+            self._conn.commit()
+            self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._count = count
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class CachedEmbeddings(Embeddings):
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [EmbeddingCache.text_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model_name, hashes)
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            hits = sum(1 for text_hash in hashes if text_hash in cached)
+            telemetry.record_cache("embedding", hits=hits, misses=len(hashes) - hits)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = {
+                text_hash: np.asarray(vector, dtype=np.float32)
+                for text_hash, vector in zip(missing.keys(), vectors)
+            }
+            self.cache.put_many(self.model_name, new_items)
+            cached.update(new_items)
+
+        return [cached[text_hash].tolist() for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+_shared_caches: Dict[str, EmbeddingCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(db_path: str, max_entries: int = 500000) -> EmbeddingCache:
+    db_path = os.path.abspath(db_path)
+    with _shared_caches_lock:
+        if db_path not in _shared_caches:
+            _shared_caches[db_path] = EmbeddingCache(db_path, max_entries=max_entries)
+        return _shared_caches[db_path]
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from .rag_evaluator import RAGEvaluator
+from .judge_cache import JudgeCache
+
+SUMMARY_METRICS = ("grounding_score", "relevancy_score", "precision_at_k", "recall_at_k", "mrr", "confidence")
+
+
+def load_questions(path: str) -> List[Dict]:
+    items = []
+    seen = set()
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("question"):
+                raise ValueError(f"{path}:{line_number}: missing 'question'")
+            item["id"] = str(item.get("id") or hashlib.sha256(item["question"].encode("utf-8")).hexdigest()[:16])
+            if item["id"] in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate id {item['id']}")
+            seen.add(item["id"])
+            items.append(item)
+    return items
+
+
+def load_completed(path: str) -> Dict[str, Dict]:
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record:
+                completed[record["id"]] = record
+    return completed
+
+
+class EvaluationRunner:
+
+    def __init__(
+        self,
+        vector_store_manager,
+        rag_pipeline,
+        evaluator: RAGEvaluator,
+        k: int = 3,
+        mode: Optional[str] = None,
+        strategy: str = "sequential",
+        max_concurrency: int = 8
+    ):
+        self.manager = vector_store_manager
+        self.pipeline = rag_pipeline
+        self.evaluator = evaluator
+        self.k = k
+        self.mode = mode
+        self.strategy = strategy
+        self.max_concurrency = max(1, max_concurrency)
+
+    def evaluate_item(self, item: Dict) -> Dict:
+        start = time.perf_counter()
+        question = item["question"]
+        k = item.get("k", self.k)
+        try:
+            retrieved_docs = self.manager.similarity_search(question, k=k, mode=self.mode)
+            result = self.pipeline.resolve_confidence(
+                self.pipeline.query(question, retrieved_docs, enable_highlighting=False, strategy=self.strategy)
+            )
+            metrics = self.evaluator.evaluate_full(question, result["answer"], retrieved_docs, item.get("relevant_doc_ids"), k)
+        except Exception as e:
+            return {"id": item["id"], "question": question, "error": str(e), "elapsed_ms": (time.perf_counter() - start) * 1000}
+        return {
+            "id": item["id"],
+            "question": question,
+            "answer": result["answer"],
+            "confidence": result["confidence"],
+            "sources": [f"{doc.metadata.get('source', 'Unknown')}:{doc.metadata.get('chunk_id', '')}" for doc, _ in retrieved_docs],
+            "grounding_score": metrics["grounding"]["grounding_score"],
+            "grounding_method": metrics["grounding"]["method"],
+            "relevancy_score": metrics["relevancy"]["relevancy_score"],
+            "relevancy_method": metrics["relevancy"]["method"],
+            "precision_at_k": metrics.get("precision_at_k"),
+            "recall_at_k": metrics.get("recall_at_k"),
+            "mrr": metrics.get("mrr"),
+            "avg_retrieval_score": float(metrics["avg_retrieval_score"]),
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
+
+    def run(
+        self,
+        questions_path: str,
+        output_path: str,
+        resume: bool = True,
+        on_result: Optional[Callable[[Dict, int, int], None]] = None
+    ) -> Dict:
+        items = load_questions(questions_path)
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not resume and os.path.exists(output_path):
+            os.remove(output_path)
+        completed = load_completed(output_path)
+        pending = [item for item in items if item["id"] not in completed]
+
+        needs_newline = os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        if needs_newline:
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+
+        records = dict(completed)
+        done = len(items) - len(pending)
+        with open(output_path, "a") as out, ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="evaluation") as executor:
+            if needs_newline:
+                out.write("\n")
+            futures = [executor.submit(self.evaluate_item, item) for item in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                records[record["id"]] = record
+                done += 1
+                if on_result is not None:
+                    on_result(record, done, len(items))
+
+        summary = self.summarize([records[item["id"]] for item in items if item["id"] in records])
+        summary["resumed"] = len(completed)
+        if self.evaluator.judge_cache is not None:
+            summary["judge_cache"] = self.evaluator.judge_cache.get_stats()
+        return summary
+
+    @staticmethod
+    def summarize(records: List[Dict]) -> Dict:
+        succeeded = [record for record in records if "error" not in record]
+        summary = {
+            "questions": len(records),
+            "succeeded": len(succeeded),
+            "errors": len(records) - len(succeeded)
+        }
+        for metric in SUMMARY_METRICS:
+            values = [record[metric] for record in succeeded if record.get(metric) is not None]
+            if values:
+                summary[metric] = float(np.mean(values))
+        latencies = [record["elapsed_ms"] for record in succeeded if "elapsed_ms" in record]
+        if latencies:
+            summary["latency_ms_p50"] = float(np.percentile(latencies, 50))
+            summary["latency_ms_p95"] = float(np.percentile(latencies, 95))
+        return summary
+
+
+def create_components(provider: str, use_llm_judge: bool, judge_cache: Optional[JudgeCache]):
+    if provider == "openai":
+        from .vector_store import VectorStoreManager
+        from .rag_pipeline import RAGPipeline
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY is required for the openai provider")
+        embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        manager = VectorStoreManager(api_key, embedding_model=embedding_model)
+        pipeline = RAGPipeline(api_key, model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), embedding_model=embedding_model)
+        judge_client = pipeline.openai_client
+    else:
+        from .vector_store_ollama import VectorStoreManager
+        from .rag_pipeline_ollama import RAGPipeline
+        manager = VectorStoreManager()
+        pipeline = RAGPipeline(model=os.getenv("OLLAMA_MODEL", "qwen2.5:0.5b"))
+        judge_client = pipeline.llm
+    evaluator = RAGEvaluator(
+        llm_client=judge_client if use_llm_judge else None,
+        judge_model=os.getenv("JUDGE_MODEL", "gpt-4o-mini"),
+        judge_cache=judge_cache
+    )
+    return manager, pipeline, evaluator
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline over a JSONL question set")
+    parser.add_argument("questions", help="JSONL file with one {\"question\", \"id\", \"relevant_doc_ids\"} object per line")
+    parser.add_argument("--output", default="eval_results.jsonl", help="Per-question results, appended as they finish")
+    parser.add_argument("--summary", default=None, help="Summary JSON path (default: <output>.summary.json)")
+    parser.add_argument("--provider", default=os.getenv("LLM_PROVIDER", "ollama").lower(), choices=["ollama", "openai"])
+    parser.add_argument("--index", default=None, help="Index name under vector_store/ (default: vector_store_<provider>/faiss_index)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--mode", default=None, choices=["dense", "hybrid"])
+    parser.add_argument("--strategy", default=os.getenv("ANSWER_STRATEGY", "sequential").lower(), choices=["sequential", "fused", "async"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--judge-cache", default="vector_store/judge_cache.sqlite")
+    parser.add_argument("--no-llm-judge", action="store_true", help="Use the keyword grounding and relevancy checks only")
+    parser.add_argument("--restart", action="store_true", help="Discard existing results instead of resuming")
+    args = parser.parse_args()
+
+    judge_cache = JudgeCache(args.judge_cache) if args.judge_cache else None
+    manager, pipeline, evaluator = create_components(args.provider, not args.no_llm_judge, judge_cache)
+    manager.load(args.index or f"vector_store_{args.provider}/faiss_index")
+    runner = EvaluationRunner(manager, pipeline, evaluator, k=args.k, mode=args.mode, strategy=args.strategy, max_concurrency=args.concurrency)
+
+    def report(record: Dict, done: int, total: int):
+        if "error" in record:
+            print(f"[{done}/{total}] {record['id']}: error: {record['error']}")
+        else:
+            print(f"[{done}/{total}] {record['id']}: grounding {record['grounding_score']:.2f}, relevancy {record['relevancy_score']:.2f}, {record['elapsed_ms']:.0f} ms")
+
+    summary = runner.run(args.questions, args.output, resume=not args.restart, on_result=report)
+    summary_path = args.summary or args.output + ".summary.json"
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from .index_factory import build_index, describe_index
+from .chunk_store import ChunkStore
+
+
+def build_faiss_store(
+    documents: List[Document],
+    embeddings: Embeddings,
+    ids: List[str],
+    index_type: str = "flat",
+    index_params: Optional[Dict] = None,
+    vectors: Optional[np.ndarray] = None
+) -> FAISS:
+    texts = [doc.page_content for doc in documents]
+    if vectors is None:
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    index = build_index(index_type, vectors.shape[1], vectors, **(index_params or {}))
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=ChunkStore(),
+        index_to_docstore_id={}
+    )
+    vector_store.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in documents], ids=ids)
+    return vector_store
+
+
+def stored_documents(vector_store: FAISS) -> Tuple[List[str], List[Document]]:
+    ids = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    return ids, [vector_store.docstore.search(doc_id) for doc_id in ids]
+
+
+def _remove_positions(index, positions: np.ndarray):
+    selector = faiss.IDSelectorBatch(positions)
+    if isinstance(index, faiss.IndexRefine):
+        faiss.downcast_index(index.base_index).remove_ids(selector)
+        faiss.downcast_index(index.refine_index).remove_ids(selector)
+        index.ntotal = faiss.downcast_index(index.refine_index).ntotal
+        return
+    ivf = faiss.extract_index_ivf(index)
+    ivf.make_direct_map(False)
+    remap = np.full(index.ntotal, -1, dtype=np.int64)
+    keep = np.setdiff1d(np.arange(index.ntotal, dtype=np.int64), positions)
+    remap[keep] = np.arange(len(keep), dtype=np.int64)
+    index.remove_ids(selector)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            list_ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            list_ids[:] = remap[list_ids]
+
+
+def delete_from_store(vector_store: FAISS, ids: List[str]):
+    index_type = describe_index(vector_store.index)
+    if index_type == "flat":
+        vector_store.delete(ids)
+        return
+
+    stale = set(ids)
+    keep = [i for i in range(vector_store.index.ntotal) if vector_store.index_to_docstore_id[i] not in stale]
+    if index_type == "hnsw":
+        vectors = full_precision_vectors(vector_store)[keep]
+        index = faiss.clone_index(vector_store.index)
+        index.reset()
+        if len(keep):
+            index.add(np.ascontiguousarray(vectors))
+        vector_store.index = index
+    else:
+        kept = set(keep)
+        _remove_positions(vector_store.index, np.array([i for i in range(vector_store.index.ntotal) if i not in kept], dtype=np.int64))
+    vector_store.docstore.delete([doc_id for doc_id in stale if isinstance(vector_store.docstore.search(doc_id), Document)])
+    vector_store.index_to_docstore_id = {new: vector_store.index_to_docstore_id[old] for new, old in enumerate(keep)}
+
+
+def search_with_params(vector_store: FAISS, embedding: List[float], k: int = 4, params=None) -> List[Tuple[Document, float]]:
+    if getattr(vector_store, "read_only", False):
+        return vector_store.similarity_search_with_score_by_vector(embedding, k=k, params=params)
+    if params is None:
+        return vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+    query = np.asarray([embedding], dtype=np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(query)
+    scores, indices = vector_store.index.search(query, k, params=params)
+    results = []
+    for score, i in zip(scores[0], indices[0]):
+        if i == -1:
+            continue
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+        if isinstance(doc, Document):
+            results.append((doc, float(score)))
+    return results
+
+
+def reconstructable(vector_store: FAISS) -> bool:
+    index_type = describe_index(vector_store.index)
+    return index_type in ("flat", "hnsw", "flat_int8", "flat_binary") or (index_type == "ivf_flat" and not getattr(vector_store, "read_only", False))
+
+
+def _embed_positions(vector_store: FAISS, positions: np.ndarray) -> np.ndarray:
+    read_only = getattr(vector_store, "read_only", False)
+    docs = [vector_store.document(int(i)) if read_only else vector_store.docstore.search(vector_store.index_to_docstore_id[int(i)]) for i in positions]
+    return np.asarray(vector_store.embedding_function.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+
+
+def full_precision_vectors(vector_store: FAISS) -> np.ndarray:
+    index = vector_store.index
+    if not reconstructable(vector_store):
+        return _embed_positions(vector_store, np.arange(index.ntotal))
+    if describe_index(index) == "ivf_flat":
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def measure_recall(vector_store: FAISS, num_queries: int = 50, k: int = 10, params=None, seed: int = 0, max_embedded: int = 10000) -> Dict:
+    index = vector_store.index
+    rng = np.random.default_rng(seed)
+    positions = None
+    if not reconstructable(vector_store) and index.ntotal > max_embedded:
+        positions = np.sort(rng.choice(index.ntotal, size=max_embedded, replace=False)).astype(np.int64)
+        vectors = np.ascontiguousarray(_embed_positions(vector_store, positions), dtype=np.float32)
+        nprobe = params.nprobe if params is not None else faiss.extract_index_ivf(index).nprobe
+        params = faiss.SearchParametersIVF(sel=faiss.IDSelectorBatch(positions), nprobe=int(nprobe))
+    else:
+        vectors = np.ascontiguousarray(full_precision_vectors(vector_store), dtype=np.float32)
+    if len(vectors) == 0:
+        return {}
+    queries = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    exact_seconds = time.perf_counter() - start
+    if positions is not None:
+        truth = positions[truth]
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k, params=params) if params is not None else index.search(queries, k)
+    approx_seconds = time.perf_counter() - start
+
+    hits = sum(len(set(row_truth) & set(row_found)) for row_truth, row_found in zip(truth.tolist(), found.tolist()))
+    return {
+        "k": k,
+        "num_queries": len(queries),
+        "num_vectors": len(vectors),
+        "recall_at_k": hits / (len(queries) * k),
+        "approx_latency_ms": 1000 * approx_seconds / len(queries),
+        "exact_latency_ms": 1000 * exact_seconds / len(queries)
+    }
+
+
+def batch_search(vector_store: FAISS, embeddings: np.ndarray, k: int = 4, params=None) -> List[List[Tuple[Document, float]]]:
+    queries = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if getattr(vector_store, "_normalize_L2", False):
+        faiss.normalize_L2(queries)
+    if params is None:
+        scores, indices = vector_store.index.search(queries, k)
+    else:
+        scores, indices = vector_store.index.search(queries, k, params=params)
+    read_only = getattr(vector_store, "read_only", False)
+    results = []
+    for row_scores, row_indices in zip(scores, indices):
+        hits = []
+        for score, i in zip(row_scores, row_indices):
+            if i == -1:
+                continue
+            doc = vector_store.document(int(i)) if read_only else vector_store.docstore.search(vector_store.index_to_docstore_id[int(i)])
+            if isinstance(doc, Document):
+                hits.append((doc, float(score)))
+        results.append(hits)
+    return results
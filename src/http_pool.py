@@ -0,0 +1,95 @@
+import asyncio
+import random
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import httpx
+import openai
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (httpx.TransportError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS_CODES
+    return getattr(error, "status_code", None) in RETRY_STATUS_CODES
+
+
+async def with_retries(
+    call: Callable[[], Awaitable[Any]],
+    retries: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0
+) -> Any:
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+            attempt += 1
+
+
+class HTTPPool:
+
+    def __init__(self, timeout: float = 120.0, max_connections: int = 32, max_keepalive_connections: int = 16, keepalive_expiry: float = 30.0):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._sync_client: Optional[httpx.Client] = None
+        self._loop_objects: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, Any]] = {}
+        self._lock = threading.RLock()
+
+    def sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(timeout=self.timeout, limits=self.limits)
+            return self._sync_client
+
+    def loop_local(self, name: str, factory: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for key in [key for key, (owner, _) in self._loop_objects.items() if owner.is_closed()]:
+                del self._loop_objects[key]
+            entry = self._loop_objects.get((id(loop), name))
+            if entry is None or entry[0] is not loop:
+                entry = (loop, factory())
+                self._loop_objects[(id(loop), name)] = entry
+            return entry[1]
+
+    def async_client(self) -> httpx.AsyncClient:
+        return self.loop_local("httpx", lambda: httpx.AsyncClient(timeout=self.timeout, limits=self.limits))
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = [(key, value) for key, (owner, value) in self._loop_objects.items() if owner is loop]
+            for key, _ in entries:
+                del self._loop_objects[key]
+        for _, value in entries:
+            if isinstance(value, httpx.AsyncClient):
+                await value.aclose()
+
+    def close(self):
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+
+_pools: Dict[str, HTTPPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_http_pool(provider: str) -> HTTPPool:
+    with _pools_lock:
+        if provider not in _pools:
+            _pools[provider] = HTTPPool()
+        return _pools[provider]
@@ -0,0 +1,143 @@
+import math
+from typing import Dict, Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+QUANTIZATION_MODES = ("none", "int8", "binary")
+TRAINING_SAMPLE_SIZE = 100000
+DEFAULT_RESCORE_FACTORS = {"int8": 4, "binary": 10}
+
+
+def sample_training_vectors(vectors: np.ndarray, max_samples: int = TRAINING_SAMPLE_SIZE, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= max_samples:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(len(vectors), size=max_samples, replace=False)]
+
+
+def default_nlist(num_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def default_pq_m(dimension: int) -> int:
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m <= dimension // 4 and dimension % m == 0:
+            return m
+    return 1
+
+
+def build_index(
+    index_type: str,
+    dimension: int,
+    training_vectors: Optional[np.ndarray] = None,
+    nlist: Optional[int] = None,
+    pq_m: Optional[int] = None,
+    pq_bits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    quantization: str = "none",
+    rescore_factor: Optional[float] = None
+) -> faiss.Index:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Expected one of {', '.join(INDEX_TYPES)}")
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization: {quantization}. Expected one of {', '.join(QUANTIZATION_MODES)}")
+    if quantization != "none" and index_type != "flat":
+        raise ValueError("Quantization is only supported with the flat index type")
+
+    if quantization != "none":
+        return build_quantized_index(quantization, dimension, training_vectors, rescore_factor)
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    if training_vectors is None or len(training_vectors) == 0:
+        raise ValueError(f"Index type {index_type} needs training vectors")
+    training_vectors = np.ascontiguousarray(sample_training_vectors(training_vectors), dtype=np.float32)
+    num_train = len(training_vectors)
+    nlist = min(nlist or default_nlist(num_train), num_train)
+
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    else:
+        pq_m = pq_m or default_pq_m(dimension)
+        pq_bits = min(pq_bits, max(1, int(math.log2(max(2, num_train // 39)))))
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_bits)
+    index.train(training_vectors)
+    return index
+
+
+def build_quantized_index(quantization: str, dimension: int, training_vectors: Optional[np.ndarray], rescore_factor: Optional[float] = None) -> faiss.Index:
+    if training_vectors is None or len(training_vectors) == 0:
+        raise ValueError(f"{quantization} quantization needs training vectors")
+    if quantization == "int8":
+        base = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+    else:
+        base = faiss.IndexLSH(dimension, dimension, True, True)
+    index = faiss.IndexRefineFlat(base)
+    index.k_factor = float(rescore_factor or DEFAULT_RESCORE_FACTORS[quantization])
+    index.train(np.ascontiguousarray(sample_training_vectors(training_vectors), dtype=np.float32))
+    return index
+
+
+def quantization_mode(index) -> str:
+    if not isinstance(index, faiss.IndexRefine):
+        return "none"
+    base = faiss.downcast_index(index.base_index)
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "int8"
+    if isinstance(base, faiss.IndexLSH):
+        return "binary"
+    return type(base).__name__
+
+
+def quantized_memory_bytes(index) -> Dict[str, int]:
+    if not isinstance(index, faiss.IndexRefine):
+        return {}
+    base = faiss.downcast_index(index.base_index)
+    return {
+        "first_pass_bytes": int(base.sa_code_size() * index.ntotal),
+        "rescore_bytes": int(4 * index.d * index.ntotal)
+    }
+
+
+def describe_index(index) -> str:
+    if isinstance(index, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    if isinstance(index, faiss.IndexRefine):
+        return f"flat_{quantization_mode(index)}"
+    return type(index).__name__
+
+
+def search_parameters(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None, rescore_factor: Optional[float] = None):
+    index_type = describe_index(index)
+    extra = {"sel": selector} if selector is not None else {}
+    if isinstance(index, faiss.IndexRefine):
+        if selector is None and not rescore_factor:
+            return None
+        base_params = faiss.SearchParameters(sel=selector) if selector is not None else None
+        return faiss.IndexRefineSearchParameters(k_factor=float(rescore_factor or index.k_factor), base_index_params=base_params)
+    if index_type in ("ivf_flat", "ivf_pq") and (nprobe or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=int(nprobe or faiss.extract_index_ivf(index).nprobe), **extra)
+    if index_type == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search), **extra)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def index_memory_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
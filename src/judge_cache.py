@@ -0,0 +1,74 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+
+class JudgeCache:
+
+    def __init__(self, db_path: str = "vector_store/judge_cache.sqlite"):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (prompt_hash, model)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def prompt_hash(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str, model: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM verdicts WHERE prompt_hash = ? AND model = ?",
+                (self.prompt_hash(prompt), model)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, prompt: str, model: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (prompt_hash, model, response, created) VALUES (?, ?, ?, ?)",
+                (self.prompt_hash(prompt), model, response, time.time())
+            )
+            self._conn.commit()
+
+    def clear(self, model: Optional[str] = None):
+        with self._lock:
+            if model is None:
+                self._conn.execute("DELETE FROM verdicts")
+            else:
+                self._conn.execute("DELETE FROM verdicts WHERE model = ?", (model,))
+            self._conn.commit()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
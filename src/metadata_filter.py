@@ -0,0 +1,157 @@
+import heapq
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from .chunk_store import ChunkStore
+from .index_factory import describe_index, search_parameters, quantization_mode
+
+COLUMN_FIELDS = ("source", "file_path")
+
+
+def normalize_filter(metadata_filter: Dict[str, Any]) -> Dict[str, set]:
+    normalized = {}
+    for field, value in metadata_filter.items():
+        values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+        normalized[field] = set(values)
+    return normalized
+
+
+def _field_values(vector_store, field: str) -> List:
+    ntotal = vector_store.index.ntotal
+    docstore = vector_store.docstore
+    if isinstance(docstore, ChunkStore) and field in COLUMN_FIELDS:
+        column = docstore.source_ids if field == "source" else docstore.file_path_ids
+        values = []
+        for i in range(ntotal):
+            string_id = column[docstore.rows[vector_store.index_to_docstore_id[i]]]
+            values.append(docstore.strings[string_id] if string_id != -1 else None)
+        return values
+    if getattr(vector_store, "read_only", False):
+        return [vector_store._record(i)["metadata"].get(field) for i in range(ntotal)]
+    values = []
+    for i in range(ntotal):
+        doc = docstore.search(vector_store.index_to_docstore_id[i])
+        values.append(doc.metadata.get(field) if isinstance(doc, Document) else None)
+    return values
+
+
+class MetadataPartitions:
+
+    def __init__(self, partition_fields: Iterable[str] = ("source",), exact_threshold: int = 50000):
+        self.partition_fields = tuple(partition_fields)
+        self.exact_threshold = exact_threshold
+        self._store = None
+        self._positions: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._sub_indexes: Dict[Tuple[str, Any], faiss.Index] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._store = None
+            self._positions = {}
+            self._sub_indexes = {}
+
+    def _bind(self, vector_store):
+        if self._store is not vector_store:
+            self._store = vector_store
+            self._positions = {}
+            self._sub_indexes = {}
+
+    def field_positions(self, vector_store, field: str) -> Dict[Any, np.ndarray]:
+        with self._lock:
+            self._bind(vector_store)
+            if field not in self._positions:
+                grouped: Dict[Any, List[int]] = {}
+                for position, value in enumerate(_field_values(vector_store, field)):
+                    try:
+                        grouped.setdefault(value, []).append(position)
+                    except TypeError:
+                        continue
+                self._positions[field] = {value: np.asarray(positions, dtype=np.int64) for value, positions in grouped.items()}
+            return self._positions[field]
+
+    def values(self, vector_store, field: str) -> List:
+        return sorted((value for value in self.field_positions(vector_store, field) if value is not None), key=str)
+
+    def positions(self, vector_store, metadata_filter: Dict[str, Any]) -> np.ndarray:
+        selected = None
+        for field, values in normalize_filter(metadata_filter).items():
+            by_value = self.field_positions(vector_store, field)
+            parts = [by_value[value] for value in values if value in by_value]
+            field_selected = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            selected = field_selected if selected is None else np.intersect1d(selected, field_selected, assume_unique=True)
+        return selected if selected is not None else np.arange(vector_store.index.ntotal, dtype=np.int64)
+
+    @staticmethod
+    def _reconstructable(vector_store) -> bool:
+        return describe_index(vector_store.index) in ("flat", "hnsw")
+
+    @staticmethod
+    def _flat_index(vector_store, positions: np.ndarray) -> faiss.Index:
+        index = vector_store.index
+        flat = faiss.IndexFlatL2(index.d)
+        if len(positions):
+            flat.add(np.ascontiguousarray(index.reconstruct_batch(positions), dtype=np.float32))
+        return flat
+
+    def _sub_index(self, vector_store, field: str, value, positions: np.ndarray) -> faiss.Index:
+        key = (field, value)
+        with self._lock:
+            sub_index = self._sub_indexes.get(key)
+        if sub_index is None:
+            sub_index = self._flat_index(vector_store, positions)
+            with self._lock:
+                if self._store is vector_store:
+                    self._sub_indexes[key] = sub_index
+        return sub_index
+
+    def _search_partitions(self, vector_store, query: np.ndarray, k: int, field: str, values: set) -> List[Tuple[float, int]]:
+        by_value = self.field_positions(vector_store, field)
+        hits = []
+        for value in values:
+            positions = by_value.get(value)
+            if positions is None or not len(positions):
+                continue
+            sub_index = self._sub_index(vector_store, field, value, positions)
+            scores, indices = sub_index.search(query, min(k, len(positions)))
+            hits.extend((float(score), int(positions[i])) for score, i in zip(scores[0], indices[0]) if i != -1)
+        return heapq.nsmallest(k, hits)
+
+    def search(
+        self,
+        vector_store,
+        embedding: List[float],
+        k: int,
+        metadata_filter: Dict[str, Any],
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[Tuple[Document, float]]:
+        query = np.asarray([embedding], dtype=np.float32)
+        if getattr(vector_store, "_normalize_L2", False):
+            faiss.normalize_L2(query)
+        normalized = normalize_filter(metadata_filter)
+        fields = list(normalized)
+
+        if len(fields) == 1 and fields[0] in self.partition_fields and self._reconstructable(vector_store):
+            hits = self._search_partitions(vector_store, query, k, fields[0], normalized[fields[0]])
+        else:
+            positions = self.positions(vector_store, metadata_filter)
+            if not len(positions):
+                return []
+            if (len(positions) <= self.exact_threshold and self._reconstructable(vector_store)) or quantization_mode(vector_store.index) == "binary":
+                scores, indices = self._flat_index(vector_store, positions).search(query, min(k, len(positions)))
+                hits = [(float(score), int(positions[i])) for score, i in zip(scores[0], indices[0]) if i != -1]
+            else:
+                selector = faiss.IDSelectorBatch(positions)
+                params = search_parameters(vector_store.index, nprobe, ef_search, selector=selector)
+                scores, indices = vector_store.index.search(query, k, params=params)
+                hits = [(float(score), int(i)) for score, i in zip(scores[0], indices[0]) if i != -1]
+
+        results = []
+        for score, position in hits:
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+            if isinstance(doc, Document):
+                results.append((doc, score))
+        return results
@@ -0,0 +1,196 @@
+import os
+import json
+import mmap
+import shutil
+import hashlib
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from .chunk_store import ChunkStore
+
+INDEX_FILE = "index.faiss"
+TEXT_FILE = "chunks.bin"
+TEXT_OFFSETS_FILE = "chunk_offsets.npy"
+METADATA_FILE = "metadata.jsonl"
+METADATA_OFFSETS_FILE = "metadata_offsets.npy"
+ID_HASHES_FILE = "id_hashes.npy"
+ID_POSITIONS_FILE = "id_positions.npy"
+
+
+def id_hash(doc_id: str) -> np.uint64:
+    return np.uint64(int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little"))
+
+
+def _offsets(payloads: List[bytes]) -> np.ndarray:
+    offsets = np.zeros(len(payloads) + 1, dtype=np.int64)
+    if payloads:
+        np.cumsum([len(payload) for payload in payloads], out=offsets[1:])
+    return offsets
+
+
+def _write_blob(directory: str, data_name: str, offsets_name: str, payloads: List[bytes]):
+    with open(os.path.join(directory, data_name), "wb") as f:
+        for payload in payloads:
+            f.write(payload)
+    np.save(os.path.join(directory, offsets_name), _offsets(payloads))
+
+
+def write_mmap_store(vector_store: FAISS, directory: str):
+    tmp_directory = directory + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    ids = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    documents = [vector_store.docstore.search(doc_id) for doc_id in ids]
+    faiss.write_index(vector_store.index, os.path.join(tmp_directory, INDEX_FILE))
+    _write_blob(tmp_directory, TEXT_FILE, TEXT_OFFSETS_FILE, [doc.page_content.encode("utf-8") for doc in documents])
+    _write_blob(
+        tmp_directory, METADATA_FILE, METADATA_OFFSETS_FILE,
+        [(json.dumps({"id": doc_id, "metadata": doc.metadata}) + "\n").encode("utf-8") for doc_id, doc in zip(ids, documents)]
+    )
+    hashes = np.fromiter((id_hash(doc_id) for doc_id in ids), dtype=np.uint64, count=len(ids))
+    order = np.argsort(hashes, kind="stable")
+    np.save(os.path.join(tmp_directory, ID_HASHES_FILE), hashes[order])
+    np.save(os.path.join(tmp_directory, ID_POSITIONS_FILE), order.astype(np.int64))
+
+    old_directory = directory + ".old"
+    shutil.rmtree(old_directory, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, old_directory)
+    os.replace(tmp_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
+
+
+def _map_file(path: str):
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_index(path: str):
+    index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    if isinstance(index, faiss.IndexIVF):
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return index
+
+
+class _LazyIds(Mapping):
+
+    def __init__(self, store: "MmapVectorStore"):
+        self.store = store
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < len(self):
+            raise KeyError(position)
+        return self.store._record(position)["id"]
+
+    def __len__(self) -> int:
+        return self.store.index.ntotal
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self)))
+
+
+class _LazyDocstore:
+
+    def __init__(self, store: "MmapVectorStore"):
+        self.store = store
+        self._positions: Optional[Dict[str, int]] = None
+
+    def _position(self, doc_id: str) -> Optional[int]:
+        if self.store.id_hashes is None:
+            if self._positions is None:
+                self._positions = {self.store._record(i)["id"]: i for i in range(self.store.index.ntotal)}
+            return self._positions.get(doc_id)
+        hashes = self.store.id_hashes
+        target = id_hash(doc_id)
+        i = int(np.searchsorted(hashes, target))
+        while i < len(hashes) and hashes[i] == target:
+            position = int(self.store.id_positions[i])
+            if self.store._record(position)["id"] == doc_id:
+                return position
+            i += 1
+        return None
+
+    def search(self, doc_id: str):
+        position = self._position(doc_id)
+        if position is None:
+            return f"ID {doc_id} not found."
+        return self.store.document(position)
+
+    @property
+    def _dict(self) -> Dict[str, Document]:
+        documents = {}
+        for i in range(self.store.index.ntotal):
+            doc = self.store.document(i)
+            documents[doc.id] = doc
+        return documents
+
+
+class MmapVectorStore:
+
+    read_only = True
+
+    def __init__(self, directory: str, embedding_function: Embeddings):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.index = _read_index(os.path.join(directory, INDEX_FILE))
+        self.text = _map_file(os.path.join(directory, TEXT_FILE))
+        self.text_offsets = np.load(os.path.join(directory, TEXT_OFFSETS_FILE), mmap_mode="r")
+        self.metadata = _map_file(os.path.join(directory, METADATA_FILE))
+        self.metadata_offsets = np.load(os.path.join(directory, METADATA_OFFSETS_FILE), mmap_mode="r")
+        self.id_hashes = None
+        self.id_positions = None
+        if os.path.exists(os.path.join(directory, ID_POSITIONS_FILE)):
+            self.id_hashes = np.load(os.path.join(directory, ID_HASHES_FILE), mmap_mode="r")
+            self.id_positions = np.load(os.path.join(directory, ID_POSITIONS_FILE), mmap_mode="r")
+        self.index_to_docstore_id = _LazyIds(self)
+        self.docstore = _LazyDocstore(self)
+        self.override_relevance_score_fn = None
+        self._normalize_L2 = False
+        self.distance_strategy = DistanceStrategy.EUCLIDEAN_DISTANCE
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, INDEX_FILE)) and os.path.exists(os.path.join(directory, METADATA_OFFSETS_FILE))
+
+    def index_bytes(self) -> int:
+        return os.path.getsize(os.path.join(self.directory, INDEX_FILE))
+
+    def _record(self, position: int) -> Dict:
+        start, end = int(self.metadata_offsets[position]), int(self.metadata_offsets[position + 1])
+        return json.loads(bytes(self.metadata[start:end]))
+
+    def document(self, position: int) -> Document:
+        start, end = int(self.text_offsets[position]), int(self.text_offsets[position + 1])
+        record = self._record(position)
+        return Document(id=record["id"], page_content=bytes(self.text[start:end]).decode("utf-8"), metadata=record["metadata"])
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, params=None) -> List[Tuple[Document, float]]:
+        query = np.asarray([embedding], dtype=np.float32)
+        if params is None:
+            scores, positions = self.index.search(query, k)
+        else:
+            scores, positions = self.index.search(query, k, params=params)
+        return [(self.document(int(i)), float(score)) for score, i in zip(scores[0], positions[0]) if i != -1]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k=k)
+
+    def to_faiss(self) -> FAISS:
+        documents = [self.document(i) for i in range(self.index.ntotal)]
+        return FAISS(
+            embedding_function=self.embedding_function,
+            index=faiss.read_index(os.path.join(self.directory, INDEX_FILE)),
+            docstore=ChunkStore.from_documents({doc.id: doc for doc in documents}),
+            index_to_docstore_id={i: doc.id for i, doc in enumerate(documents)}
+        )
@@ -0,0 +1,189 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from .chunk_store import CHUNK_STORE_FILE, INDEX_FILE
+from .document_processor import DocumentProcessor
+from .request_coalescer import RequestCoalescer, request_key
+from .telemetry import get_telemetry
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class RAGService:
+
+    def __init__(
+        self,
+        vector_store_manager,
+        rag_pipeline,
+        provider: str,
+        index_name: str = "faiss_index",
+        reranker=None,
+        rerank_overfetch: int = 3,
+        rerank_top_n: Optional[int] = None,
+        refresh_interval: float = 1.0
+    ):
+        self.manager = vector_store_manager
+        self.pipeline = rag_pipeline
+        self.provider = provider
+        self.index_name = index_name
+        self.reranker = reranker
+        self.rerank_overfetch = rerank_overfetch
+        self.rerank_top_n = rerank_top_n
+        self.refresh_interval = refresh_interval
+        self.coalescer = RequestCoalescer()
+        self.index_path = os.path.join(vector_store_manager.persist_directory, index_name)
+        self.lock_path = self.index_path + ".lock"
+        self.reloads = 0
+        self._version = None
+        self._last_refresh_check = 0.0
+        self._refresh_lock = threading.Lock()
+
+    @contextmanager
+    def _process_lock(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _index_version(self) -> Optional[Tuple[int, int]]:
+        if self.manager.use_mmap:
+            path = os.path.join(self.index_path, "mmap", INDEX_FILE)
+        else:
+            path = os.path.join(self.index_path, CHUNK_STORE_FILE)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _clear_answer_cache(self):
+        answer_cache = getattr(self.pipeline, "answer_cache", None)
+        if answer_cache is not None:
+            answer_cache.clear()
+
+    def load(self):
+        with self._process_lock(), self.manager.write_lock:
+            if os.path.exists(self.index_path):
+                self.manager.load(self.index_name)
+            self._version = self._index_version()
+
+    def refresh(self) -> bool:
+        with self._refresh_lock:
+            now = time.monotonic()
+            if now - self._last_refresh_check < self.refresh_interval:
+                return False
+            self._last_refresh_check = now
+            version = self._index_version()
+            if version is None or version == self._version:
+                return False
+            with self._process_lock(), self.manager.write_lock:
+                self.manager.load(self.index_name)
+                self._version = self._index_version()
+            self.reloads += 1
+        self._clear_answer_cache()
+        return True
+
+    def _retrieve(self, query: str, k: int, mode: Optional[str], metadata_filter: Optional[Dict], rerank: bool):
+        if self.manager.vector_store is None:
+            raise ValueError("No documents have been indexed yet")
+        if rerank and self.reranker is not None:
+            candidates = self.manager.similarity_search(query, k=k * self.rerank_overfetch, mode=mode, filter=metadata_filter)
+            return self.reranker.rerank(query, candidates, top_n=min(k, self.rerank_top_n or k), baseline_k=k)
+        return self.manager.similarity_search(query, k=k, mode=mode, filter=metadata_filter), None
+
+    async def _answer(
+        self,
+        question: str,
+        k: int,
+        mode: Optional[str],
+        metadata_filter: Optional[Dict],
+        strategy: str,
+        enable_highlighting: bool,
+        conversation_history: Optional[List[Dict]],
+        retrieval_query: Optional[str],
+        rerank: bool
+    ) -> Dict:
+        retrieved_docs, rerank_stats = await asyncio.to_thread(self._retrieve, retrieval_query or question, k, mode, metadata_filter, rerank)
+        result = dict(await self.pipeline.aquery(
+            question,
+            retrieved_docs,
+            enable_highlighting=enable_highlighting,
+            conversation_history=conversation_history,
+            strategy=strategy
+        ))
+        if rerank_stats is not None:
+            result["rerank"] = rerank_stats
+        return result
+
+    async def query(
+        self,
+        question: str,
+        k: int = 4,
+        mode: Optional[str] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        strategy: str = "sequential",
+        enable_highlighting: bool = True,
+        conversation_history: Optional[List[Dict]] = None,
+        retrieval_query: Optional[str] = None,
+        rerank: bool = False
+    ) -> Dict:
+        if time.monotonic() - self._last_refresh_check >= self.refresh_interval:
+            await asyncio.to_thread(self.refresh)
+        key = request_key(question.strip(), k, mode, metadata_filter, strategy, enable_highlighting, conversation_history, retrieval_query, rerank, self._version)
+        return await self.coalescer.run(key, lambda: self._answer(
+            question, k, mode, metadata_filter, strategy, enable_highlighting, conversation_history, retrieval_query, rerank
+        ))
+
+    def ingest(self, file_paths: List[str]) -> Dict:
+        processor = DocumentProcessor()
+        chunks = added = removed = 0
+        with self._process_lock(), self.manager.write_lock:
+            if self._index_version() not in (None, self._version):
+                self.manager.load(self.index_name)
+                self._clear_answer_cache()
+            for file_path in file_paths:
+                documents = processor.process_document(file_path)
+                stats = self.manager.upsert_file(file_path, documents)
+                chunks += len(documents)
+                added += stats["added"]
+                removed += stats["removed"]
+            if self.manager.vector_store is not None:
+                self.manager.save(self.index_name)
+            self._version = self._index_version()
+        answer_cache = getattr(self.pipeline, "answer_cache", None)
+        if answer_cache is not None:
+            answer_cache.invalidate_sources(file_paths)
+        return {"files": len(file_paths), "chunks": chunks, "added": added, "removed": removed}
+
+    def list_values(self, field: str = "source") -> List:
+        return self.manager.list_values(field)
+
+    def get_stats(self) -> Dict:
+        stats = {
+            "provider": self.provider,
+            "pid": os.getpid(),
+            "index": self.manager.get_stats(),
+            "reloads": self.reloads,
+            "coalescing": self.coalescer.get_stats(),
+            "context_packing": self.pipeline.get_packing_stats()
+        }
+        answer_cache = getattr(self.pipeline, "answer_cache", None)
+        if answer_cache is not None:
+            stats["answer_cache"] = answer_cache.get_stats()
+        if self.reranker is not None:
+            stats["rerank"] = self.reranker.get_stats()
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            stats["telemetry"] = telemetry.get_snapshot()
+        return stats
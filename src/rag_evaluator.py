@@ -1,13 +1,44 @@
 import re
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import Iterable, List, Dict, Sequence, Tuple, Optional, Union
 from langchain_core.documents import Document
+from .judge_cache import JudgeCache
 
 
 class RAGEvaluator:
     
-    def __init__(self, llm_client=None):
+    def __init__(self, llm_client=None, judge_model: str = "gpt-4o-mini", judge_cache: Optional[JudgeCache] = None):
         self.llm_client = llm_client
+        self.judge_model = judge_model
+        self.judge_cache = judge_cache
+    
+    def _judge_model_name(self) -> str:
+        if hasattr(self.llm_client, 'invoke'):
+            return getattr(self.llm_client, 'model_name', None) or getattr(self.llm_client, 'model', None) or type(self.llm_client).__name__
+        return self.judge_model
+    
+    def _judge(self, prompt: str) -> str:
+        model = self._judge_model_name()
+        if self.judge_cache is not None:
+            cached = self.judge_cache.get(prompt, model)
+            if cached is not None:
+                return cached
+        
+        if hasattr(self.llm_client, 'invoke'):
+            response = self.llm_client.invoke(prompt)
+            text = str(getattr(response, 'content', response))
+        else:
+            response = self.llm_client.chat.completions.create(
+                model=self.judge_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                max_tokens=10
+            )
+            text = response.choices[0].message.content or ""
+        
+        if self.judge_cache is not None and text:
+            self.judge_cache.put(prompt, model, text)
+        return text
     
     def precision_at_k(
         self, 
@@ -18,6 +49,7 @@ class RAGEvaluator:
         if not retrieved_docs or k <= 0:
             return 0.0
         
+        relevant_doc_ids = set(relevant_doc_ids)
         top_k_docs = retrieved_docs[:k]
         relevant_count = 0
         
@@ -37,6 +69,8 @@ class RAGEvaluator:
         if not relevant_doc_ids or not retrieved_docs:
             return 0.0
         
+        num_relevant = len(relevant_doc_ids)
+        relevant_doc_ids = set(relevant_doc_ids)
         top_k_docs = retrieved_docs[:k]
         retrieved_relevant = 0
         
@@ -45,7 +79,7 @@ class RAGEvaluator:
             if doc_id in relevant_doc_ids or doc.metadata.get('source', '') in relevant_doc_ids:
                 retrieved_relevant += 1
         
-        return retrieved_relevant / len(relevant_doc_ids)
+        return retrieved_relevant / num_relevant
     
     def mean_reciprocal_rank(
         self,
@@ -55,6 +89,7 @@ class RAGEvaluator:
         if not retrieved_docs or not relevant_doc_ids:
             return 0.0
         
+        relevant_doc_ids = set(relevant_doc_ids)
         for rank, (doc, _) in enumerate(retrieved_docs, 1):
             doc_id = doc.metadata.get('source', '') + str(doc.metadata.get('chunk_id', ''))
             if doc_id in relevant_doc_ids or doc.metadata.get('source', '') in relevant_doc_ids:
@@ -62,6 +97,109 @@ class RAGEvaluator:
         
         return 0.0
     
+    @staticmethod
+    def _result_keys(item) -> Tuple[str, Optional[str]]:
+        doc = item[0] if isinstance(item, tuple) else item
+        if isinstance(doc, Document):
+            source = doc.metadata.get('source', '')
+            return source + str(doc.metadata.get('chunk_id', '')), source
+        return str(doc), None
+    
+    @staticmethod
+    def _lookup_grades(
+        ids: np.ndarray,
+        relevant_keys: np.ndarray,
+        relevant_grades: np.ndarray,
+        vocabulary_size: int
+    ) -> np.ndarray:
+        if not len(relevant_keys):
+            return np.zeros(ids.shape)
+        keys = np.arange(ids.shape[0])[:, None] * vocabulary_size + ids
+        positions = np.minimum(np.searchsorted(relevant_keys, keys), len(relevant_keys) - 1)
+        matched = (ids >= 0) & (relevant_keys[positions] == keys)
+        return np.where(matched, relevant_grades[positions], 0.0)
+    
+    def batch_retrieval_metrics(
+        self,
+        ranked_results: Sequence[Sequence],
+        relevance: Sequence[Union[Iterable[str], Dict[str, float]]],
+        ks: Iterable[int] = (1, 3, 5, 10),
+        per_query: bool = False
+    ) -> Dict:
+        if len(ranked_results) != len(relevance):
+            raise ValueError("ranked_results and relevance must have the same length")
+        ks = sorted(set(int(k) for k in ks if k > 0))
+        if not ks:
+            raise ValueError("ks must contain at least one positive cutoff")
+        num_queries = len(ranked_results)
+        depth = ks[-1]
+        
+        ids: Dict[str, int] = {}
+        primary = np.full((num_queries, depth), -1, dtype=np.int64)
+        secondary = np.full((num_queries, depth), -1, dtype=np.int64)
+        lengths = np.zeros(num_queries, dtype=np.int64)
+        for i, results in enumerate(ranked_results):
+            top = list(results[:depth])
+            lengths[i] = len(top)
+            for rank, item in enumerate(top):
+                key, source = self._result_keys(item)
+                primary[i, rank] = ids.setdefault(key, len(ids))
+                if source is not None:
+                    secondary[i, rank] = ids.setdefault(source, len(ids))
+        
+        query_index, relevant_ids, grades = [], [], []
+        ideal = np.zeros((num_queries, depth))
+        num_relevant = np.zeros(num_queries)
+        for i, judged in enumerate(relevance):
+            judged = judged if isinstance(judged, dict) else dict.fromkeys(judged, 1.0)
+            judged = {key: float(grade) for key, grade in judged.items() if grade > 0}
+            num_relevant[i] = len(judged)
+            best = sorted(judged.values(), reverse=True)[:depth]
+            ideal[i, :len(best)] = best
+            for key, grade in judged.items():
+                query_index.append(i)
+                relevant_ids.append(ids.setdefault(key, len(ids)))
+                grades.append(grade)
+        
+        vocabulary_size = len(ids) + 1
+        relevant_keys = np.asarray(query_index, dtype=np.int64) * vocabulary_size + np.asarray(relevant_ids, dtype=np.int64)
+        order = np.argsort(relevant_keys)
+        relevant_keys = relevant_keys[order]
+        relevant_grades = np.asarray(grades, dtype=np.float64)[order]
+        gains = np.maximum(
+            self._lookup_grades(primary, relevant_keys, relevant_grades, vocabulary_size),
+            self._lookup_grades(secondary, relevant_keys, relevant_grades, vocabulary_size)
+        )
+        
+        hits = gains > 0
+        ranks = np.arange(1, depth + 1)
+        discounts = 1.0 / np.log2(ranks + 1)
+        cumulative_hits = np.cumsum(hits, axis=1)
+        precision_at_rank = cumulative_hits / ranks
+        average_precision_sum = np.cumsum(precision_at_rank * hits, axis=1)
+        dcg = np.cumsum(gains * discounts, axis=1)
+        idcg = np.cumsum(ideal * discounts, axis=1)
+        first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, 0)
+        
+        def ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+            return np.divide(numerator, denominator, out=np.zeros(num_queries), where=denominator > 0)
+        
+        per_k = {"precision_at_k": {}, "recall_at_k": {}, "mrr_at_k": {}, "ndcg_at_k": {}, "map_at_k": {}}
+        for k in ks:
+            column = k - 1
+            per_k["precision_at_k"][k] = ratio(cumulative_hits[:, column], np.minimum(k, lengths))
+            per_k["recall_at_k"][k] = np.minimum(ratio(cumulative_hits[:, column], num_relevant), 1.0)
+            per_k["mrr_at_k"][k] = ratio((first_hit > 0) & (first_hit <= k), np.maximum(first_hit, 1) * 1.0)
+            per_k["ndcg_at_k"][k] = np.minimum(ratio(dcg[:, column], idcg[:, column]), 1.0)
+            per_k["map_at_k"][k] = np.minimum(ratio(average_precision_sum[:, column], np.minimum(num_relevant, k)), 1.0)
+        
+        results = {"num_queries": num_queries, "ks": ks}
+        for metric, values in per_k.items():
+            results[metric] = {k: float(v.mean()) if num_queries else 0.0 for k, v in values.items()}
+        if per_query:
+            results["per_query"] = {metric: {k: v.tolist() for k, v in values.items()} for metric, values in per_k.items()}
+        return results
+    
     def grounding_accuracy(
         self,
         answer: str,
@@ -96,24 +234,10 @@ Respond with ONLY a number between 0-100.
 Score:"""
         
         try:
-            if hasattr(self.llm_client, 'invoke'):
-                response = self.llm_client.invoke(prompt)
-                numbers = re.findall(r'\d+', str(response))
-                if numbers:
-                    score = int(numbers[0])
-                    return {'grounding_score': min(max(score, 0), 100) / 100, 'method': 'llm'}
-            elif hasattr(self.llm_client, 'chat'):
-                response = self.llm_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0,
-                    max_tokens=10
-                )
-                text = response.choices[0].message.content
-                numbers = re.findall(r'\d+', text)
-                if numbers:
-                    score = int(numbers[0])
-                    return {'grounding_score': min(max(score, 0), 100) / 100, 'method': 'llm'}
+            numbers = re.findall(r'\d+', self._judge(prompt))
+            if numbers:
+                score = int(numbers[0])
+                return {'grounding_score': min(max(score, 0), 100) / 100, 'method': 'llm'}
         except:
             pass
         
@@ -173,24 +297,10 @@ Respond with ONLY a number between 0-100.
 Score:"""
         
         try:
-            if hasattr(self.llm_client, 'invoke'):
-                response = self.llm_client.invoke(prompt)
-                numbers = re.findall(r'\d+', str(response))
-                if numbers:
-                    score = int(numbers[0])
-                    return {'relevancy_score': min(max(score, 0), 100) / 100, 'method': 'llm'}
-            elif hasattr(self.llm_client, 'chat'):
-                response = self.llm_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0,
-                    max_tokens=10
-                )
-                text = response.choices[0].message.content
-                numbers = re.findall(r'\d+', text)
-                if numbers:
-                    score = int(numbers[0])
-                    return {'relevancy_score': min(max(score, 0), 100) / 100, 'method': 'llm'}
+            numbers = re.findall(r'\d+', self._judge(prompt))
+            if numbers:
+                score = int(numbers[0])
+                return {'relevancy_score': min(max(score, 0), 100) / 100, 'method': 'llm'}
         except:
             pass
         
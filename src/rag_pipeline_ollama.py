@@ -1,25 +1,47 @@
 import re
+import time
+import asyncio
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Dict, Tuple, Optional
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
 from sentence_transformers import SentenceTransformer
 from .text_highlighter import TextHighlighter
+from .answer_cache import SemanticAnswerCache
+from .http_pool import HTTPPool, get_http_pool, with_retries
+from .context_packer import ContextPacker
+from .telemetry import get_telemetry, span
+
+_confidence_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="confidence")
 
 class RAGPipeline:
-    def __init__(self, model: str = "qwen2.5:0.5b", base_url: str = "http://localhost:11434"):
-        self.llm = Ollama(
+    def __init__(self, model: str = "qwen2.5:0.5b", base_url: str = "http://localhost:11434", embeddings: Optional[Embeddings] = None, llm: Optional[Ollama] = None, answer_cache: Optional[SemanticAnswerCache] = None, http_pool: Optional[HTTPPool] = None, max_concurrency: int = 8, max_retries: int = 3, context_packer: Optional[ContextPacker] = None):
+        self.llm = llm or Ollama(
             model=model,
             base_url=base_url,
             temperature=0
         )
         self.model_name = model
         self.base_url = base_url
+        self.http_pool = http_pool or get_http_pool("ollama")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
         
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embeddings = embeddings
+        self.embedding_model = None if embeddings is not None else SentenceTransformer('all-MiniLM-L6-v2')
         
         self.highlighter = TextHighlighter(embedding_function=self._get_embeddings)
+        self.stream_metrics = deque(maxlen=1000)
+        
+        self.context_packer = context_packer
+        self.packing_metrics = deque(maxlen=1000)
+        self.answer_cache = answer_cache
+        if answer_cache is not None and answer_cache.embedding_function is None:
+            answer_cache.embedding_function = self._get_embeddings
         
         self.rag_prompt = PromptTemplate.from_template("""
 Answer the question using only the provided context. You must cite sources for every claim you make.
@@ -60,11 +82,38 @@ Provide ONLY a number between 0-100 where:
 - 0-49: Low confidence, limited support
 
 Confidence Score (number only):
+""")
+        
+        self.fused_prompt = PromptTemplate.from_template("""
+Answer the question using only the provided context. You must cite sources for every claim you make.
+
+{conversation_history}
+
+Context:
+{context}
+
+Question: {question}
+
+Instructions:
+- If conversation history is provided above, use it to understand what "it", "that", "them" or other pronouns refer to
+- If the current question is a follow-up (like "how do I request it?"), interpret "it" based on the previous conversation
+- Answer using ONLY information from the context above
+- For each statement or fact, cite the source number in brackets like [Source 1] or [Source 2]
+- If multiple sources support a claim, cite all of them like [Source 1, Source 3]
+- If the context doesn't contain enough information, clearly state that
+- Be specific and cite sources after each relevant sentence
+- After the answer, add one final line in the form "Confidence: N" where N is a number between 0-100 rating how well the context supports your answer
+  (90-100: fully supported, 70-89: mostly supported, 50-69: partial support, 0-49: limited support)
+
+Answer:
 """)
     
     def _get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
         try:
-            embeddings = self.embedding_model.encode(texts)
+            if self.embeddings is not None:
+                embeddings = self.embeddings.embed_documents(texts)
+            else:
+                embeddings = self.embedding_model.encode(texts)
             return [np.array(emb) for emb in embeddings]
         except:
             return [np.zeros(384) for _ in texts]
@@ -77,24 +126,30 @@ Confidence Score (number only):
             formatted.append(f"[Source {i}: {source}]\n{content}\n")
         return "\n".join(formatted)
     
+    def _format_conversation_history(self, conversation_history: Optional[List[Dict]] = None) -> str:
+        history_text = ""
+        if conversation_history:
+            history_text = "Previous conversation:\n"
+            for i, chat in enumerate(conversation_history, 1):
+                history_text += f"Q{i}: {chat['question']}\nA{i}: {chat['answer']}\n\n"
+        return history_text
+    
     def generate_answer(self, question: str, retrieved_docs: List[Tuple[Document, float]], conversation_history: Optional[List[Dict]] = None) -> str:
         if not retrieved_docs:
             return "I don't have enough information to answer this question."
         
         context = self.format_documents(retrieved_docs)
         
-        history_text = ""
-        if conversation_history:
-            history_text = "Previous conversation:\n"
-            for i, chat in enumerate(conversation_history, 1):
-                history_text += f"Q{i}: {chat['question']}\nA{i}: {chat['answer']}\n\n"
+        history_text = self._format_conversation_history(conversation_history)
         
         prompt = self.rag_prompt.format(
             context=context, 
             question=question,
             conversation_history=history_text
         )
-        answer = self.llm.invoke(prompt)
+        with span("llm.generate_answer", model=self.model_name) as llm_span:
+            answer = self.llm.invoke(prompt)
+            llm_span.add_tokens(prompt, answer)
         return answer.strip()
     
     def calculate_confidence(self, question: str, answer: str, retrieved_docs: List[Tuple[Document, float]]) -> int:
@@ -107,7 +162,9 @@ Confidence Score (number only):
                 question=question,
                 answer=answer
             )
-            score_str = self.llm.invoke(prompt)
+            with span("llm.calculate_confidence", model=self.model_name) as llm_span:
+                score_str = self.llm.invoke(prompt)
+                llm_span.add_tokens(prompt, score_str)
             numbers = re.findall(r'\d+', score_str)
             if numbers:
                 score = int(numbers[0])
@@ -117,31 +174,374 @@ Confidence Score (number only):
         
         return confidence_score
     
-    def query(self, question: str, retrieved_docs: List[Tuple[Document, float]], enable_highlighting: bool = True, conversation_history: Optional[List[Dict]] = None) -> Dict:
-        answer = self.generate_answer(question, retrieved_docs, conversation_history)
-        confidence = self.calculate_confidence(question, answer, retrieved_docs)
+    def _parse_fused_response(self, text: str) -> Tuple[str, int]:
+        matches = list(re.finditer(r'confidence(?:\s+score)?\s*[:=]\s*(\d{1,3})\s*%?', text, re.IGNORECASE))
+        if not matches:
+            return text.strip(), 50
+        last = matches[-1]
+        answer = (text[:last.start()] + text[last.end():]).strip()
+        return answer, min(max(int(last.group(1)), 0), 100)
+    
+    def generate_answer_with_confidence(self, question: str, retrieved_docs: List[Tuple[Document, float]], conversation_history: Optional[List[Dict]] = None) -> Tuple[str, int]:
+        if not retrieved_docs:
+            return "I don't have enough information to answer this question.", 0
         
-        sources = []
-        for doc, score in retrieved_docs:
-            content = doc.page_content
-            
-            display_content = content if len(content) <= 500 else content[:500] + "..."
+        context = self.format_documents(retrieved_docs)
+        history_text = self._format_conversation_history(conversation_history)
+        
+        prompt = self.fused_prompt.format(
+            context=context,
+            question=question,
+            conversation_history=history_text
+        )
+        with span("llm.generate_answer_with_confidence", model=self.model_name) as llm_span:
+            response = self.llm.invoke(prompt)
+            llm_span.add_tokens(prompt, response)
+        return self._parse_fused_response(response)
+    
+    def _stream_answer_tokens(self, prompt_template, question: str, retrieved_docs: List[Tuple[Document, float]], conversation_history: Optional[List[Dict]] = None) -> Iterator[str]:
+        prompt = prompt_template.format(
+            context=self.format_documents(retrieved_docs),
+            question=question,
+            conversation_history=self._format_conversation_history(conversation_history)
+        )
+        yield from self.llm.stream(prompt)
+    
+    def resolve_confidence(self, result: Dict, timeout: Optional[float] = None) -> Dict:
+        future = result.pop("confidence_future", None)
+        if future is not None:
+            try:
+                result["confidence"] = future.result(timeout=timeout)
+            except:
+                result["confidence"] = 50
+        return result
+    
+    def _build_sources(self, retrieved_docs: List[Tuple[Document, float]], answer: str, enable_highlighting: bool = True) -> List[Dict]:
+        with span("pipeline.build_sources", sources=len(retrieved_docs), highlighting=enable_highlighting):
+            display_contents = []
+            for doc, score in retrieved_docs:
+                content = doc.page_content
+                display_contents.append(content if len(content) <= 500 else content[:500] + "...")
             
             if enable_highlighting:
-                display_content = self.highlighter.highlight_text(display_content, answer)
+                display_contents = self.highlighter.highlight_batch(display_contents, answer)
             
-            sources.append({
-                "source": doc.metadata.get('source', 'Unknown'),
-                "chunk_id": doc.metadata.get('chunk_id', 0),
-                "content": display_content,
-                "relevance_score": float(1 / (1 + score))
-            })
+            sources = []
+            for (doc, score), display_content in zip(retrieved_docs, display_contents):
+                sources.append({
+                    "source": doc.metadata.get('source', 'Unknown'),
+                    "chunk_id": doc.metadata.get('chunk_id', 0),
+                    "content": display_content,
+                    "relevance_score": float(1 / (1 + score))
+                })
+            return sources
+    
+    def _pack_context(self, question: str, retrieved_docs: List[Tuple[Document, float]]) -> Tuple[List[Tuple[Document, float]], Optional[Dict]]:
+        if self.context_packer is None or not retrieved_docs:
+            return retrieved_docs, None
+        with span("pipeline.pack_context") as pack_span:
+            context_docs, packing = self.context_packer.pack(question, retrieved_docs)
+            pack_span.set(tokens_before=packing["tokens_before"], tokens_after=packing["tokens_after"])
+        self.packing_metrics.append(packing)
+        return context_docs, packing
+    
+    def _cache_variant(self, enable_highlighting: bool, conversation_history: Optional[List[Dict]], strategy: str = "sequential") -> Optional[str]:
+        if self.answer_cache is None or conversation_history:
+            return None
+        return f"highlight={enable_highlighting}:strategy={strategy}"
+    
+    def query(self, question: str, retrieved_docs: List[Tuple[Document, float]], enable_highlighting: bool = True, conversation_history: Optional[List[Dict]] = None, strategy: str = "sequential") -> Dict:
+        if strategy not in ("sequential", "fused", "async"):
+            raise ValueError(f"Unknown query strategy: {strategy}")
         
-        return {
+        with span("pipeline.query", strategy=strategy, sources=len(retrieved_docs)):
+            cache_variant = self._cache_variant(enable_highlighting, conversation_history, strategy)
+            if cache_variant is not None:
+                cached = self.answer_cache.lookup(question, retrieved_docs, self.model_name, cache_variant)
+                get_telemetry().record_cache("answer", hits=int(cached is not None), misses=int(cached is None))
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+            context_docs, packing = self._pack_context(question, retrieved_docs)
+            
+            confidence_future: Optional[Future] = None
+            if strategy == "fused":
+                answer, confidence = self.generate_answer_with_confidence(question, context_docs, conversation_history)
+            else:
+                answer = self.generate_answer(question, context_docs, conversation_history)
+                if strategy == "async":
+                    confidence = None
+                    confidence_future = _confidence_executor.submit(self.calculate_confidence, question, answer, context_docs)
+                else:
+                    confidence = self.calculate_confidence(question, answer, context_docs)
+            
+            sources = self._build_sources(context_docs, answer, enable_highlighting)
+            
+            result = {
+                "answer": answer,
+                "confidence": confidence,
+                "sources": sources,
+                "num_sources": len(sources),
+                "highlight_legend": self.highlighter.get_highlight_legend() if enable_highlighting else "",
+                "strategy": strategy
+            }
+            if confidence_future is not None:
+                result["confidence_future"] = confidence_future
+            if packing is not None:
+                result["packing"] = packing
+            if cache_variant is not None:
+                if confidence_future is None:
+                    self.answer_cache.store(question, retrieved_docs, self.model_name, result, cache_variant)
+                else:
+                    def store_when_scored(future):
+                        if not future.exception():
+                            self.answer_cache.store(question, retrieved_docs, self.model_name, dict(result, confidence=future.result()), cache_variant)
+                    confidence_future.add_done_callback(store_when_scored)
+            return result
+    
+    def _llm_stage(self, prompt_template) -> str:
+        if prompt_template is self.confidence_prompt:
+            return "llm.calculate_confidence"
+        if prompt_template is self.fused_prompt:
+            return "llm.generate_answer_with_confidence"
+        return "llm.generate_answer"
+    
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        return self.http_pool.loop_local(f"semaphore:{id(self)}", lambda: asyncio.Semaphore(self.max_concurrency))
+    
+    async def _acomplete(self, prompt_template: PromptTemplate, **variables) -> str:
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt_template.format(**variables),
+            "stream": False,
+            "options": {"temperature": 0}
+        }
+        client = self.http_pool.async_client()
+        
+        async def generate() -> str:
+            response = await client.post(f"{self.base_url.rstrip('/')}/api/generate", json=payload)
+            response.raise_for_status()
+            return response.json()["response"]
+        
+        with span(self._llm_stage(prompt_template), model=self.model_name) as llm_span:
+            async with self._async_semaphore():
+                response = await with_retries(generate, retries=self.max_retries)
+            llm_span.add_tokens(payload["prompt"], response)
+        return response
+    
+    async def agenerate_answer(self, question: str, retrieved_docs: List[Tuple[Document, float]], conversation_history: Optional[List[Dict]] = None) -> str:
+        if not retrieved_docs:
+            return "I don't have enough information to answer this question."
+        
+        answer = await self._acomplete(
+            self.rag_prompt,
+            context=self.format_documents(retrieved_docs),
+            question=question,
+            conversation_history=self._format_conversation_history(conversation_history)
+        )
+        return answer.strip()
+    
+    async def acalculate_confidence(self, question: str, answer: str, retrieved_docs: List[Tuple[Document, float]]) -> int:
+        confidence_score = 50
+        
+        try:
+            score_str = await self._acomplete(
+                self.confidence_prompt,
+                context=self.format_documents(retrieved_docs),
+                question=question,
+                answer=answer
+            )
+            numbers = re.findall(r'\d+', score_str)
+            if numbers:
+                score = int(numbers[0])
+                confidence_score = min(max(score, 0), 100)
+        except:
+            confidence_score = 50
+        
+        return confidence_score
+    
+    async def agenerate_answer_with_confidence(self, question: str, retrieved_docs: List[Tuple[Document, float]], conversation_history: Optional[List[Dict]] = None) -> Tuple[str, int]:
+        if not retrieved_docs:
+            return "I don't have enough information to answer this question.", 0
+        
+        response = await self._acomplete(
+            self.fused_prompt,
+            context=self.format_documents(retrieved_docs),
+            question=question,
+            conversation_history=self._format_conversation_history(conversation_history)
+        )
+        return self._parse_fused_response(response)
+    
+    async def aquery(self, question: str, retrieved_docs: List[Tuple[Document, float]], enable_highlighting: bool = True, conversation_history: Optional[List[Dict]] = None, strategy: str = "sequential") -> Dict:
+        if strategy not in ("sequential", "fused", "async"):
+            raise ValueError(f"Unknown query strategy: {strategy}")
+        
+        with span("pipeline.aquery", strategy=strategy, sources=len(retrieved_docs)):
+            cache_variant = self._cache_variant(enable_highlighting, conversation_history, strategy)
+            if cache_variant is not None:
+                cached = await asyncio.to_thread(self.answer_cache.lookup, question, retrieved_docs, self.model_name, cache_variant)
+                get_telemetry().record_cache("answer", hits=int(cached is not None), misses=int(cached is None))
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+            context_docs, packing = self._pack_context(question, retrieved_docs)
+            
+            if strategy == "fused":
+                answer, confidence = await self.agenerate_answer_with_confidence(question, context_docs, conversation_history)
+                sources = await asyncio.to_thread(self._build_sources, context_docs, answer, enable_highlighting)
+            else:
+                answer = await self.agenerate_answer(question, context_docs, conversation_history)
+                if strategy == "async":
+                    confidence, sources = await asyncio.gather(
+                        self.acalculate_confidence(question, answer, context_docs),
+                        asyncio.to_thread(self._build_sources, context_docs, answer, enable_highlighting)
+                    )
+                else:
+                    confidence = await self.acalculate_confidence(question, answer, context_docs)
+                    sources = await asyncio.to_thread(self._build_sources, context_docs, answer, enable_highlighting)
+            
+            result = {
+                "answer": answer,
+                "confidence": confidence,
+                "sources": sources,
+                "num_sources": len(sources),
+                "highlight_legend": self.highlighter.get_highlight_legend() if enable_highlighting else "",
+                "strategy": strategy
+            }
+            if packing is not None:
+                result["packing"] = packing
+            if cache_variant is not None:
+                await asyncio.to_thread(self.answer_cache.store, question, retrieved_docs, self.model_name, result, cache_variant)
+            return result
+    
+    def stream_query(self, question: str, retrieved_docs: List[Tuple[Document, float]], enable_highlighting: bool = True, conversation_history: Optional[List[Dict]] = None, strategy: str = "sequential") -> Iterator[Dict]:
+        start = time.perf_counter()
+        cache_variant = self._cache_variant(enable_highlighting, conversation_history, strategy)
+        if cache_variant is not None:
+            cached = self.answer_cache.lookup(question, retrieved_docs, self.model_name, cache_variant)
+            get_telemetry().record_cache("answer", hits=int(cached is not None), misses=int(cached is None))
+            if cached is not None:
+                cached["cached"] = True
+                cached["metrics"] = {
+                    "time_to_first_token_ms": (time.perf_counter() - start) * 1000,
+                    "total_ms": (time.perf_counter() - start) * 1000
+                }
+                yield {"type": "token", "content": cached["answer"]}
+                yield {"type": "sources", "sources": cached["sources"], "highlight_legend": cached["highlight_legend"]}
+                yield {"type": "confidence", "confidence": cached["confidence"]}
+                yield {"type": "done", "result": cached}
+                return
+        context_docs, packing = self._pack_context(question, retrieved_docs)
+        fused = strategy == "fused"
+        if context_docs:
+            tokens = self._stream_answer_tokens(self.fused_prompt if fused else self.rag_prompt, question, context_docs, conversation_history)
+        else:
+            tokens = iter(["I don't have enough information to answer this question."])
+        
+        parts = []
+        emitted = 0
+        time_to_first_token = None
+        llm_start = time.perf_counter()
+        for token in tokens:
+            if not token:
+                continue
+            if time_to_first_token is None:
+                time_to_first_token = (time.perf_counter() - start) * 1000
+            parts.append(token)
+            if not fused:
+                yield {"type": "token", "content": token}
+                continue
+            text = "".join(parts)
+            line_start = text.rfind("\n") + 1
+            last_line = text[line_start:].strip().lower()
+            safe = line_start if ("confidence" in last_line or "confidence".startswith(last_line)) else len(text)
+            if safe > emitted:
+                yield {"type": "token", "content": text[emitted:safe]}
+                emitted = safe
+        
+        text = "".join(parts)
+        llm_seconds = time.perf_counter() - llm_start
+        confidence_future: Optional[Future] = None
+        if fused:
+            answer, confidence = self._parse_fused_response(text) if context_docs else (text, 0)
+            emitted_text = text[:emitted].strip()
+            if answer.startswith(emitted_text) and len(answer) > len(emitted_text):
+                yield {"type": "token", "content": answer[len(emitted_text):]}
+        else:
+            answer = text.strip()
+            confidence = None
+            confidence_future = _confidence_executor.submit(self.calculate_confidence, question, answer, context_docs)
+        
+        sources = self._build_sources(context_docs, answer, enable_highlighting)
+        legend = self.highlighter.get_highlight_legend() if enable_highlighting else ""
+        yield {"type": "sources", "sources": sources, "highlight_legend": legend}
+        
+        if confidence_future is not None:
+            try:
+                confidence = confidence_future.result()
+            except:
+                confidence = 50
+        yield {"type": "confidence", "confidence": confidence}
+        
+        metrics = {
+            "time_to_first_token_ms": time_to_first_token,
+            "total_ms": (time.perf_counter() - start) * 1000
+        }
+        self.stream_metrics.append(metrics)
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            telemetry.observe("llm.stream_answer", llm_seconds)
+            if time_to_first_token is not None:
+                telemetry.observe("llm.time_to_first_token", time_to_first_token / 1000)
+            telemetry.add_tokens("llm.stream_answer", self.format_documents(context_docs) + question, text)
+            telemetry.observe("pipeline.stream_query", metrics["total_ms"] / 1000)
+        result = {
             "answer": answer,
             "confidence": confidence,
             "sources": sources,
             "num_sources": len(sources),
-            "highlight_legend": self.highlighter.get_highlight_legend() if enable_highlighting else ""
+            "highlight_legend": legend,
+            "strategy": strategy,
+            "metrics": metrics
+        }
+        if packing is not None:
+            result["packing"] = packing
+        if cache_variant is not None:
+            self.answer_cache.store(question, retrieved_docs, self.model_name, result, cache_variant)
+        yield {"type": "done", "result": result}
+    
+    def batch_query(self, questions: List[str], retrieved_docs_list: List[List[Tuple[Document, float]]], enable_highlighting: bool = True, strategy: str = "sequential", max_concurrency: int = 4) -> List[Dict]:
+        if len(questions) != len(retrieved_docs_list):
+            raise ValueError("questions and retrieved_docs_list must have the same length")
+        
+        def run(question: str, retrieved_docs: List[Tuple[Document, float]]) -> Dict:
+            try:
+                return self.resolve_confidence(self.query(question, retrieved_docs, enable_highlighting=enable_highlighting, strategy=strategy))
+            except Exception as e:
+                return {"question": question, "error": str(e)}
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="batch-query") as executor:
+            futures = [executor.submit(run, question, retrieved_docs) for question, retrieved_docs in zip(questions, retrieved_docs_list)]
+            return [future.result() for future in futures]
+    
+    def get_packing_stats(self) -> Dict:
+        if not self.packing_metrics:
+            return {"count": 0}
+        saved = [m["tokens_saved"] for m in self.packing_metrics]
+        return {
+            "count": len(saved),
+            "tokens_saved_avg": float(np.mean(saved)),
+            "tokens_saved_total": int(np.sum(saved)),
+            "tokens_after_p95": float(np.percentile([m["tokens_after"] for m in self.packing_metrics], 95))
+        }
+    
+    def get_stream_stats(self) -> Dict:
+        ttfts = [m["time_to_first_token_ms"] for m in self.stream_metrics if m["time_to_first_token_ms"] is not None]
+        if not ttfts:
+            return {"count": 0}
+        return {
+            "count": len(ttfts),
+            "ttft_ms_p50": float(np.percentile(ttfts, 50)),
+            "ttft_ms_p95": float(np.percentile(ttfts, 95)),
+            "ttft_ms_last": ttfts[-1]
         }
-
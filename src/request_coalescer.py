@@ -0,0 +1,35 @@
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+
+
+def request_key(*parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RequestCoalescer:
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        self.requests += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._in_flight.pop(key, None) if self._in_flight.get(key) is done else None)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight)
+        }
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from sentence_transformers import CrossEncoder
+from .telemetry import span
+
+
+class CrossEncoderReranker:
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        budget_ms: float = 150.0,
+        batch_size: int = 16,
+        max_chars: int = 2000,
+        model: Optional[CrossEncoder] = None
+    ):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.model = model
+        self.ms_per_pair: Optional[float] = None
+        self.history = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def _get_model(self) -> CrossEncoder:
+        with self._lock:
+            if self.model is None:
+                self.model = CrossEncoder(self.model_name, device="cpu")
+            return self.model
+
+    @staticmethod
+    def _context_chars(docs: List[Tuple[Document, float]]) -> int:
+        return sum(len(doc.page_content) for doc, _ in docs)
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Tuple[Document, float]],
+        top_n: int = 4,
+        baseline_k: Optional[int] = None,
+        budget_ms: Optional[float] = None
+    ) -> Tuple[List[Tuple[Document, float]], Dict]:
+        model = self._get_model()
+        start = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+
+        scores: List[float] = []
+        with span("retrieval.rerank", candidates=len(candidates)) as rerank_span:
+            while len(scores) < len(candidates):
+                batch = candidates[len(scores):len(scores) + self.batch_size]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if self.ms_per_pair is not None and elapsed_ms + self.ms_per_pair * len(batch) > budget_ms:
+                    break
+                batch_start = time.perf_counter()
+                batch_scores = model.predict([(query, doc.page_content[:self.max_chars]) for doc, _ in batch], batch_size=self.batch_size)
+                pair_ms = (time.perf_counter() - batch_start) * 1000 / len(batch)
+                self.ms_per_pair = pair_ms if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * pair_ms
+                scores.extend(float(score) for score in batch_scores)
+            rerank_span.set(scored=len(scores))
+
+        scored = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        order = scored + list(range(len(scores), len(candidates)))
+        reranked = [candidates[i] for i in order[:top_n]]
+
+        baseline = candidates[:baseline_k or top_n]
+        stats = {
+            "candidates": len(candidates),
+            "scored": len(scores),
+            "kept": len(reranked),
+            "skipped": not scores and bool(candidates),
+            "truncated": 0 < len(scores) < len(candidates),
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+            "context_chars_baseline": self._context_chars(baseline),
+            "context_chars_sent": self._context_chars(reranked)
+        }
+        stats["context_chars_saved"] = stats["context_chars_baseline"] - stats["context_chars_sent"]
+        with self._lock:
+            self.history.append(stats)
+        return reranked, stats
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            history = list(self.history)
+        if not history:
+            return {"queries": 0}
+        return {
+            "queries": len(history),
+            "avg_elapsed_ms": sum(item["elapsed_ms"] for item in history) / len(history),
+            "skip_rate": sum(item["skipped"] for item in history) / len(history),
+            "truncation_rate": sum(item["truncated"] for item in history) / len(history),
+            "avg_context_chars_saved": sum(item["context_chars_saved"] for item in history) / len(history),
+            "ms_per_pair": self.ms_per_pair
+        }
@@ -0,0 +1,94 @@
+import weakref
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ResourceRegistry:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._resources: Dict[str, Any] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._disposers: Dict[str, Callable[[Any], None]] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def acquire(self, key: str, factory: Callable[[], Any], dispose: Optional[Callable[[Any], None]] = None) -> Any:
+        with self._key_lock(key):
+            with self._lock:
+                if key in self._resources:
+                    self._refcounts[key] += 1
+                    return self._resources[key]
+            resource = factory()
+            with self._lock:
+                self._resources[key] = resource
+                self._refcounts[key] = 1
+                if dispose is not None:
+                    self._disposers[key] = dispose
+            return resource
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._resources.get(key)
+
+    def release(self, key: str):
+        with self._lock:
+            if key not in self._refcounts:
+                return
+            self._refcounts[key] -= 1
+            if self._refcounts[key] > 0:
+                return
+            resource = self._resources.pop(key)
+            del self._refcounts[key]
+            dispose = self._disposers.pop(key, None)
+        if dispose is not None:
+            dispose(resource)
+
+    def refcount(self, key: str) -> int:
+        with self._lock:
+            return self._refcounts.get(key, 0)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._refcounts)
+
+    def lease(self) -> "ResourceLease":
+        return ResourceLease(self)
+
+
+def _release_keys(registry: ResourceRegistry, keys: List[str]):
+    while keys:
+        registry.release(keys.pop())
+
+
+def _release_in_background(registry: ResourceRegistry, keys: List[str]):
+    if keys:
+        threading.Thread(target=_release_keys, args=(registry, keys), name="resource-lease-release", daemon=True).start()
+
+
+class ResourceLease:
+
+    def __init__(self, registry: ResourceRegistry):
+        self.registry = registry
+        self.keys: List[str] = []
+        self._finalizer = weakref.finalize(self, _release_in_background, registry, self.keys)
+        self._finalizer.atexit = False
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def acquire(self, key: str, factory: Callable[[], Any], dispose: Optional[Callable[[Any], None]] = None) -> Any:
+        resource = self.registry.acquire(key, factory, dispose)
+        self.keys.append(key)
+        return resource
+
+    def release_all(self):
+        _release_keys(self.registry, self.keys)
+
+
+registry = ResourceRegistry()
@@ -0,0 +1,330 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .context_packer import approximate_tokens
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNTER_HELP = {
+    "rag_llm_tokens_total": "Estimated LLM prompt and completion tokens by stage",
+    "rag_cache_requests_total": "Cache lookups by cache and result",
+    "rag_ingested_chunks_total": "Chunks produced by document ingestion"
+}
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("rag_current_span", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+
+
+class _NoopSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def add_tokens(self, prompt: str = "", completion: str = ""):
+        pass
+
+    def breakdown(self) -> Dict[str, float]:
+        return {}
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("telemetry", "name", "attributes", "parent", "children", "start", "duration", "_token", "_otel", "_otel_span")
+
+    def __init__(self, telemetry: "Telemetry", name: str, attributes: Dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.children: List["Span"] = []
+        self.start = 0.0
+        self.duration = 0.0
+        self._otel = None
+        self._otel_span = None
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        if self.telemetry.tracer is not None:
+            self._otel = self.telemetry.tracer.start_as_current_span(self.name, attributes=self._otel_attributes(self.attributes))
+            self._otel_span = self._otel.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            _current_span.set(self.parent)
+        if self._otel is not None:
+            self._otel.__exit__(exc_type, exc, tb)
+        if self.parent is not None:
+            self.parent.children.append(self)
+        self.telemetry.finish(self, exc_type is not None)
+        return False
+
+    @staticmethod
+    def _otel_attributes(attributes: Dict) -> Dict:
+        return {key: value if isinstance(value, (bool, int, float, str)) else str(value) for key, value in attributes.items() if value is not None}
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        if self._otel_span is not None:
+            self._otel_span.set_attributes(self._otel_attributes(attributes))
+
+    def add_tokens(self, prompt: str = "", completion: str = ""):
+        prompt_tokens, completion_tokens = self.telemetry.add_tokens(self.name, prompt, completion)
+        self.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def breakdown(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+
+        def visit(span: "Span"):
+            for child in sorted(span.children, key=lambda child: child.start):
+                totals[child.name] = totals.get(child.name, 0.0) + child.duration * 1000
+                visit(child)
+
+        visit(self)
+        return totals
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "duration_ms": self.duration * 1000,
+            "attributes": dict(self.attributes),
+            "children": [child.to_dict() for child in sorted(self.children, key=lambda child: child.start)]
+        }
+
+
+class Telemetry:
+
+    def __init__(self, enabled: bool = False, history: int = 1000, trace_history: int = 100):
+        self.enabled = enabled
+        self.tracer = None
+        self.history = history
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._errors: Dict[str, int] = {}
+        self._recent: Dict[str, deque] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.traces = deque(maxlen=trace_history)
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        if not self.enabled:
+            return
+        with self._lock:
+            if name not in self._buckets:
+                self._buckets[name] = [0] * (len(DURATION_BUCKETS) + 1)
+                self._sums[name] = 0.0
+                self._errors[name] = 0
+                self._recent[name] = deque(maxlen=self.history)
+            self._buckets[name][bisect.bisect_left(DURATION_BUCKETS, seconds)] += 1
+            self._sums[name] += seconds
+            self._recent[name].append(seconds)
+            if error:
+                self._errors[name] += 1
+
+    def finish(self, span: Span, error: bool = False):
+        self.observe(span.name, span.duration, error)
+        if span.parent is None:
+            self.traces.append(span.to_dict())
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def add_tokens(self, stage: str, prompt: str = "", completion: str = "") -> Tuple[int, int]:
+        prompt_tokens = approximate_tokens(prompt) if prompt else 0
+        completion_tokens = approximate_tokens(completion) if completion else 0
+        self.increment("rag_llm_tokens_total", prompt_tokens, stage=stage, kind="prompt")
+        self.increment("rag_llm_tokens_total", completion_tokens, stage=stage, kind="completion")
+        return prompt_tokens, completion_tokens
+
+    def record_cache(self, cache: str, hits: int = 0, misses: int = 0):
+        if hits:
+            self.increment("rag_cache_requests_total", hits, cache=cache, result="hit")
+        if misses:
+            self.increment("rag_cache_requests_total", misses, cache=cache, result="miss")
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._sums.clear()
+            self._errors.clear()
+            self._recent.clear()
+            self._counters.clear()
+            self.traces.clear()
+
+    def get_snapshot(self) -> Dict:
+        with self._lock:
+            recent = {name: list(values) for name, values in self._recent.items()}
+            counts = {name: sum(buckets) for name, buckets in self._buckets.items()}
+            sums = dict(self._sums)
+            errors = dict(self._errors)
+            counters = dict(self._counters)
+
+        stages = {}
+        for name in sorted(recent):
+            values = np.asarray(recent[name]) * 1000
+            stages[name] = {
+                "count": counts[name],
+                "errors": errors[name],
+                "mean_ms": sums[name] * 1000 / counts[name],
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99))
+            }
+
+        tokens: Dict[str, Dict[str, float]] = {}
+        caches: Dict[str, Dict[str, float]] = {}
+        for (name, labels), value in counters.items():
+            labels = dict(labels)
+            if name == "rag_llm_tokens_total":
+                tokens.setdefault(labels["stage"], {"prompt": 0, "completion": 0})[labels["kind"]] += int(value)
+            elif name == "rag_cache_requests_total":
+                caches.setdefault(labels["cache"], {"hits": 0, "misses": 0})["hits" if labels["result"] == "hit" else "misses"] += int(value)
+        for stats in caches.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+        return {"enabled": self.enabled, "stages": stages, "tokens": tokens, "caches": caches}
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            buckets = {name: list(values) for name, values in self._buckets.items()}
+            sums = dict(self._sums)
+            errors = dict(self._errors)
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP rag_stage_duration_seconds Time spent in each stage of the RAG pipeline",
+            "# TYPE rag_stage_duration_seconds histogram"
+        ]
+        for name in sorted(buckets):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ("+Inf",), buckets[name]):
+                cumulative += count
+                lines.append(f'rag_stage_duration_seconds_bucket{{{_labels([("stage", name), ("le", bound)])}}} {cumulative}')
+            lines.append(f'rag_stage_duration_seconds_sum{{{_labels([("stage", name)])}}} {sums[name]}')
+            lines.append(f'rag_stage_duration_seconds_count{{{_labels([("stage", name)])}}} {cumulative}')
+
+        lines.append("# HELP rag_stage_errors_total Stage executions that raised an exception")
+        lines.append("# TYPE rag_stage_errors_total counter")
+        for name in sorted(errors):
+            lines.append(f'rag_stage_errors_total{{{_labels([("stage", name)])}}} {errors[name]}')
+
+        for metric in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{{{_labels(labels)}}} {value:g}" if labels else f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _opentelemetry_tracer(service_name: str):
+    if trace is None:
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        return trace.get_tracer(service_name)
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    return trace.get_tracer(service_name)
+
+
+_telemetry = Telemetry(enabled=os.getenv("TELEMETRY", "false").lower() in ("1", "true", "yes"))
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def span(name: str, **attributes):
+    if not _telemetry.enabled:
+        return NOOP_SPAN
+    return Span(_telemetry, name, attributes)
+
+
+def configure_telemetry(enabled: bool = True, opentelemetry: bool = False, service_name: str = "mini-rag-assistant") -> Telemetry:
+    _telemetry.enabled = enabled
+    if enabled and opentelemetry:
+        tracer = _opentelemetry_tracer(service_name)
+        if tracer is None:
+            raise ValueError("OpenTelemetry export requires the opentelemetry-api package")
+        _telemetry.tracer = tracer
+    else:
+        _telemetry.tracer = None
+    return _telemetry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _telemetry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _metrics_server
@@ -1,6 +1,7 @@
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import numpy as np
+from .telemetry import span
 
 
 class TextHighlighter:
@@ -58,68 +59,116 @@ class TextHighlighter:
     def _calculate_sentence_similarity(
         self, query: str, sentences: List[str]
     ) -> List[float]:
-        if not self.embedding_function or not sentences:
-            return [0.0] * len(sentences)
+        if not sentences:
+            return []
+        return self._batch_similarities(query, [sentences])[0]
 
-        try:
-            query_embedding = self.embedding_function([query])[0]
-            sentence_embeddings = self.embedding_function(sentences)
+    def _batch_similarities(
+        self, query: str, sentence_groups: List[List[str]]
+    ) -> List[List[float]]:
+        all_sentences = [sentence for group in sentence_groups for sentence in group]
+        if not self.embedding_function or not all_sentences:
+            return [[0.0] * len(group) for group in sentence_groups]
 
-            similarities = []
-            for sent_emb in sentence_embeddings:
-                similarity = np.dot(query_embedding, sent_emb) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(sent_emb)
+        try:
+            with span("highlight.embed", sentences=len(all_sentences)):
+                embeddings = np.asarray(
+                    self.embedding_function([query] + all_sentences), dtype=np.float32
                 )
-                similarities.append(float(similarity))
-
-            return similarities
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+            similarities = (embeddings[1:] @ embeddings[0]).tolist()
         except:
-            return [0.0] * len(sentences)
+            similarities = [0.0] * len(all_sentences)
 
-    def highlight_text(
-        self, text: str, response: str, similarity_threshold: float = 0.5
-    ) -> str:
-        if not text or not response:
-            return text
+        grouped = []
+        offset = 0
+        for group in sentence_groups:
+            grouped.append(similarities[offset:offset + len(group)])
+            offset += len(group)
+        return grouped
 
+    def _normalize_text(self, text: str) -> str:
         text = re.sub(r'\n\s*\n', '\n\n', text)
         text = re.sub(r'[ \t]+', ' ', text)
-        text = text.strip()
-
-        keywords = self._extract_keywords(response)
-
-        sentences = self._split_into_sentences(text)
-
-        similarities = self._calculate_sentence_similarity(response, sentences)
-
-        highlighted_text = text
-
+        return text.strip()
+
+    def _keyword_pattern(self, response: str) -> Optional[re.Pattern]:
+        keywords = sorted(set(self._extract_keywords(response)), key=len, reverse=True)
+        if not keywords:
+            return None
+        return re.compile(
+            r'\b(?:' + '|'.join(re.escape(k) for k in keywords) + r')\b', re.IGNORECASE
+        )
+
+    def _apply_highlights(
+        self,
+        text: str,
+        sentences: List[str],
+        similarities: List[float],
+        similarity_threshold: float,
+        keyword_pattern: Optional[re.Pattern],
+    ) -> str:
+        def mark_keywords(segment: str) -> str:
+            if keyword_pattern is None:
+                return segment
+            return keyword_pattern.sub(
+                lambda match: f'<mark style="background-color: #ffeb3b; padding: 2px 4px; border-radius: 3px; font-weight: 600; color: #2c3e50; display: inline;">{match.group(0)}</mark>',
+                segment,
+            )
+
+        pieces = []
+        cursor = 0
         for sentence, similarity in zip(sentences, similarities):
-            if similarity >= similarity_threshold and sentence in highlighted_text:
-                intensity = int(255 - (similarity * 100))
-                color = f"rgb(144, 238, {intensity})"
-
-                highlighted_sentence = f'<span style="background-color: {color}; padding: 2px 4px; border-radius: 3px; color: #2c3e50; display: inline;" title="Relevance: {similarity:.0%}">{sentence}</span>'
-                highlighted_text = highlighted_text.replace(
-                    sentence, highlighted_sentence, 1
+            if similarity < similarity_threshold:
+                continue
+            position = text.find(sentence, cursor)
+            if position < 0:
+                continue
+            pieces.append(mark_keywords(text[cursor:position]))
+
+            intensity = int(255 - (similarity * 100))
+            color = f"rgb(144, 238, {intensity})"
+            pieces.append(
+                f'<span style="background-color: {color}; padding: 2px 4px; border-radius: 3px; color: #2c3e50; display: inline;" title="Relevance: {similarity:.0%}">{mark_keywords(sentence)}</span>'
+            )
+            cursor = position + len(sentence)
+
+        pieces.append(mark_keywords(text[cursor:]))
+        return ''.join(pieces)
+
+    def highlight_batch(
+        self, texts: List[str], response: str, similarity_threshold: float = 0.5
+    ) -> List[str]:
+        if not response:
+            return list(texts)
+
+        with span("highlight.batch", texts=len(texts)):
+            normalized = [self._normalize_text(text) if text else text for text in texts]
+            sentence_groups = [
+                self._split_into_sentences(text) if text else [] for text in normalized
+            ]
+            similarity_groups = self._batch_similarities(response, sentence_groups)
+            keyword_pattern = self._keyword_pattern(response)
+
+            highlighted = []
+            for text, sentences, similarities in zip(normalized, sentence_groups, similarity_groups):
+                if not text:
+                    highlighted.append(text)
+                    continue
+                highlighted.append(
+                    self._apply_highlights(
+                        text, sentences, similarities, similarity_threshold, keyword_pattern
+                    )
                 )
+            return highlighted
 
-        for keyword in keywords:
-            parts = re.split(r'(<[^>]+>)', highlighted_text)
-            
-            for i, part in enumerate(parts):
-                if not part.startswith('<'):
-                    pattern = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
-                    
-                    def replace_func(match):
-                        matched_text = match.group(0)
-                        return f'<mark style="background-color: #ffeb3b; padding: 2px 4px; border-radius: 3px; font-weight: 600; color: #2c3e50; display: inline;">{matched_text}</mark>'
-                    
-                    parts[i] = pattern.sub(replace_func, part)
-            
-            highlighted_text = ''.join(parts)
-
-        return highlighted_text
+    def highlight_text(
+        self, text: str, response: str, similarity_threshold: float = 0.5
+    ) -> str:
+        if not text or not response:
+            return text
+        return self.highlight_batch([text], response, similarity_threshold)[0]
 
     def get_highlight_legend(self) -> str:
         return """
@@ -1,59 +1,331 @@
 import os
-from typing import List, Tuple
+import uuid
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from .embedding_cache import CachedEmbeddings, get_embedding_cache
+from .chunk_tracker import ChunkTracker
+from .faiss_utils import build_faiss_store, stored_documents, search_with_params, measure_recall, batch_search, full_precision_vectors
+from .chunk_store import ChunkStore, as_chunk_store, save_faiss_store, load_faiss_store
+from .mmap_store import MmapVectorStore, write_mmap_store
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .metadata_filter import MetadataPartitions
+from .index_factory import INDEX_TYPES, QUANTIZATION_MODES, describe_index, search_parameters, index_memory_bytes, quantization_mode, quantized_memory_bytes
+from .telemetry import span
+from .rw_lock import ReadWriteLock
+
+SEARCH_MODES = ("dense", "hybrid")
 
 class VectorStoreManager:
-    def __init__(self, openai_api_key: str, persist_directory: str = "vector_store", embedding_model: str = "text-embedding-3-small"):
-        self.embeddings = OpenAIEmbeddings(
+    def __init__(self, openai_api_key: str, persist_directory: str = "vector_store", embedding_model: str = "text-embedding-3-small", embedding_dimensions: Optional[int] = None, use_embedding_cache: bool = True, embedding_cache_path: Optional[str] = None, embeddings: Optional[Embeddings] = None, index_type: str = "flat", index_params: Optional[dict] = None, nprobe: Optional[int] = None, ef_search: Optional[int] = None, use_mmap: bool = False, search_mode: str = "dense", partition_fields: Tuple[str, ...] = ("source",), quantization: str = "none", rescore_factor: Optional[float] = None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        if quantization != "none" and index_type != "flat":
+            raise ValueError("Quantization is only supported with the flat index type")
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {search_mode}")
+        self.embeddings = embeddings or OpenAIEmbeddings(
             openai_api_key=openai_api_key,
-            model=embedding_model
+            model=embedding_model,
+            dimensions=embedding_dimensions
         )
         self.persist_directory = persist_directory
         self.vector_store = None
+        self.chunk_tracker = ChunkTracker()
+        self.write_lock = threading.RLock()
+        self.index_lock = ReadWriteLock()
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        if quantization != "none":
+            self.index_params = dict(self.index_params, quantization=quantization, rescore_factor=rescore_factor)
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.use_mmap = use_mmap
+        self._pending_chunk_map = None
+        self.search_mode = search_mode
+        self.bm25_index = BM25Index()
+        self._pending_bm25 = None
+        self.bm25_lock = threading.Lock()
+        self.partitions = MetadataPartitions(partition_fields)
         self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
         os.makedirs(persist_directory, exist_ok=True)
+        
+        self.embedding_cache = None
+        if use_embedding_cache:
+            self.embedding_cache = get_embedding_cache(embedding_cache_path or os.path.join(persist_directory, "embedding_cache.sqlite"))
+            self.embeddings = CachedEmbeddings(self.embeddings, self.embedding_cache, f"openai:{embedding_model}:{embedding_dimensions}" if embedding_dimensions else f"openai:{embedding_model}")
     
-    def create_vector_store(self, documents: List[Document]) -> FAISS:
+    def create_vector_store(self, documents: List[Document], vectors: Optional[np.ndarray] = None) -> FAISS:
         if not documents:
             raise ValueError("No documents provided")
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
-        return self.vector_store
+        ids = [str(uuid.uuid4()) for _ in documents]
+        with span("index.build", documents=len(documents)), self.write_lock:
+            vector_store = build_faiss_store(documents, self.embeddings, ids, self.index_type, self.index_params, vectors)
+            with self.index_lock.write():
+                self.vector_store = vector_store
+                self.chunk_tracker.reset()
+                self.chunk_tracker.register(ids, documents)
+                self._pending_chunk_map = None
+                self.bm25_index.reset()
+                self.bm25_index.add(ids, [doc.page_content for doc in documents])
+                self._pending_bm25 = None
+        return vector_store
     
     def add_documents(self, documents: List[Document]):
         if self.vector_store is None:
             raise ValueError("Vector store not initialized")
-        self.vector_store.add_documents(documents)
+        with span("index.add", documents=len(documents)), self.write_lock:
+            self._ensure_writable()
+            texts = [doc.page_content for doc in documents]
+            vectors = self.embeddings.embed_documents(texts)
+            with self.index_lock.write():
+                ids = self.vector_store.add_embeddings(
+                    list(zip(texts, vectors)),
+                    metadatas=[doc.metadata for doc in documents],
+                    ids=[str(uuid.uuid4()) for _ in documents]
+                )
+                self.chunk_tracker.register(ids, documents)
+                self.bm25_index.add(ids, texts)
+                self.partitions.invalidate()
+    
+    def embed_new_chunks(self, file_path: str, documents: List[Document]) -> Dict[str, List[float]]:
+        tracker = self.chunk_tracker
+        if self._pending_chunk_map is not None:
+            tracker = ChunkTracker()
+            tracker.load(self._pending_chunk_map)
+        new_docs = tracker.new_chunks(file_path, documents)
+        if not new_docs:
+            return {}
+        with span("index.embed_chunks", documents=len(new_docs)):
+            vectors = self.embeddings.embed_documents([doc.page_content for doc in new_docs])
+        return {ChunkTracker.chunk_hash(doc.page_content): vector for doc, vector in zip(new_docs, vectors)}
+    
+    def upsert_file(self, file_path: str, documents: List[Document], vectors: Optional[Dict[str, List[float]]] = None) -> dict:
+        with span("index.upsert", documents=len(documents)), self.write_lock:
+            if self.vector_store is None:
+                if not documents:
+                    return {"added": 0, "removed": 0, "kept": 0}
+                hashes = [ChunkTracker.chunk_hash(doc.page_content) for doc in documents]
+                known = vectors is not None and all(chunk_hash in vectors for chunk_hash in hashes)
+                self.create_vector_store(documents, np.asarray([vectors[chunk_hash] for chunk_hash in hashes], dtype=np.float32) if known else None)
+                return {"added": len(documents), "removed": 0, "kept": 0}
+            self._ensure_writable()
+            if vectors is None:
+                vectors = self.embed_new_chunks(file_path, documents)
+            with self.index_lock.write():
+                previous_ids = self.chunk_tracker.file_ids(file_path)
+                stats = self.chunk_tracker.upsert(self.vector_store, file_path, documents, vectors)
+                self._sync_bm25(previous_ids, self.chunk_tracker.file_ids(file_path))
+                self.partitions.invalidate()
+            return stats
+    
+    def delete_file(self, file_path: str) -> int:
+        with self.write_lock:
+            if self.vector_store is None:
+                return 0
+            self._ensure_writable()
+            with self.index_lock.write():
+                previous_ids = self.chunk_tracker.file_ids(file_path)
+                removed = self.chunk_tracker.remove(self.vector_store, file_path)
+                self._sync_bm25(previous_ids, [])
+                self.partitions.invalidate()
+            return removed
+    
+    def _ensure_bm25(self) -> BM25Index:
+        if self._pending_bm25 is None:
+            return self.bm25_index
+        with self.bm25_lock:
+            if self._pending_bm25 is not None:
+                if not self.bm25_index.load(self._pending_bm25):
+                    ids, documents = stored_documents(self.vector_store)
+                    self.bm25_index.add(ids, [doc.page_content for doc in documents])
+                self._pending_bm25 = None
+        return self.bm25_index
+    
+    def _sync_bm25(self, previous_ids: List[str], current_ids: List[str]):
+        previous, current = set(previous_ids), set(current_ids)
+        self.bm25_index.remove(previous - current)
+        added = [doc_id for doc_id in current_ids if doc_id not in previous]
+        self.bm25_index.add(added, [self.vector_store.docstore.search(doc_id).page_content for doc_id in added])
+    
+    def _ensure_writable(self):
+        with self.write_lock:
+            if isinstance(self.vector_store, MmapVectorStore):
+                vector_store = self.vector_store.to_faiss()
+                with self.index_lock.write():
+                    self.vector_store = vector_store
+            if self._pending_chunk_map is not None:
+                if not self.chunk_tracker.load(self._pending_chunk_map):
+                    self.chunk_tracker.rebuild_from_store(self.vector_store)
+                self._pending_chunk_map = None
+            self._ensure_bm25()
+    
+    def rebuild_index(self, index_type: Optional[str] = None):
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized")
+        with self.write_lock:
+            self._ensure_writable()
+            self.index_type = index_type or self.index_type
+            ids, documents = stored_documents(self.vector_store)
+            vectors = full_precision_vectors(self.vector_store)
+            vector_store = build_faiss_store(documents, self.embeddings, ids, self.index_type, self.index_params, vectors)
+            with self.index_lock.write():
+                self.vector_store = vector_store
+    
+    def requires_training(self) -> bool:
+        return self.index_type in ("ivf_flat", "ivf_pq") or self.quantization != "none"
+    
+    def similarity_search(self, query: str, k: int = 4, nprobe: Optional[int] = None, ef_search: Optional[int] = None, mode: Optional[str] = None, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized")
+        with span("retrieval.search", k=k, mode=mode or self.search_mode, filtered=bool(filter)):
+            if (mode or self.search_mode) == "hybrid":
+                return self.hybrid_search(query, k=k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+            return self._dense_search(query, k, nprobe, ef_search, filter)
+    
+    def hybrid_search(self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized")
+        fetch_k = fetch_k or max(4 * k, 20)
+        dense = self._dense_search(query, fetch_k, nprobe, ef_search, filter)
+        with self.index_lock.read():
+            return self._fuse(query, dense, k, fetch_k, rrf_k, filter)
+    
+    def _fuse(self, query: str, dense: List[Tuple[Document, float]], k: int, fetch_k: int, rrf_k: int = 60, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        with span("retrieval.bm25", fetch_k=fetch_k):
+            if filter:
+                allowed = {self.vector_store.index_to_docstore_id[int(i)] for i in self.partitions.positions(self.vector_store, filter)}
+                sparse = [(doc_id, score) for doc_id, score in self._ensure_bm25().search(query, len(self.bm25_index)) if doc_id in allowed][:fetch_k]
+            else:
+                sparse = self._ensure_bm25().search(query, fetch_k)
+        documents = {doc.id: doc for doc, _ in dense}
+        fused = reciprocal_rank_fusion([[doc.id for doc, _ in dense], [doc_id for doc_id, _ in sparse]], rrf_k)
+        best_score = 2.0 / (rrf_k + 1)
+        results = []
+        for doc_id, score in fused[:k]:
+            doc = documents.get(doc_id) or self.vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                results.append((doc, best_score / score - 1.0))
+        return results
     
-    def similarity_search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+    def batch_similarity_search(self, queries: List[str], k: int = 4, nprobe: Optional[int] = None, ef_search: Optional[int] = None, mode: Optional[str] = None, filter: Optional[dict] = None) -> List[List[Tuple[Document, float]]]:
         if self.vector_store is None:
             raise ValueError("Vector store not initialized")
-        return self.vector_store.similarity_search_with_score(query, k=k)
+        if not queries:
+            return []
+        hybrid = (mode or self.search_mode) == "hybrid"
+        fetch_k = max(4 * k, 20) if hybrid else k
+        with span("retrieval.embed_queries", queries=len(queries)):
+            embedder = self.embeddings.embeddings if isinstance(self.embeddings, CachedEmbeddings) else self.embeddings
+            vectors = np.asarray(embedder.embed_documents(list(queries)), dtype=np.float32)
+        with self.index_lock.read():
+            with span("retrieval.faiss_batch_search", queries=len(queries), k=fetch_k, filtered=bool(filter)):
+                if filter:
+                    dense_results = [
+                        self.partitions.search(self.vector_store, vector, fetch_k, filter, nprobe or self.nprobe, ef_search or self.ef_search)
+                        for vector in vectors
+                    ]
+                else:
+                    params = search_parameters(self.vector_store.index, nprobe or self.nprobe, ef_search or self.ef_search, rescore_factor=self.rescore_factor)
+                    dense_results = batch_search(self.vector_store, vectors, fetch_k, params)
+            if not hybrid:
+                return dense_results
+            return [self._fuse(query, dense, k, fetch_k, filter=filter) for query, dense in zip(queries, dense_results)]
+    
+    def _dense_search(self, query: str, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        with span("retrieval.embed_query"):
+            vector = self.embeddings.embed_query(query)
+        with span("retrieval.faiss_search", k=k, filtered=bool(filter)), self.index_lock.read():
+            if filter:
+                return self.partitions.search(self.vector_store, vector, k, filter, nprobe or self.nprobe, ef_search or self.ef_search)
+            params = search_parameters(self.vector_store.index, nprobe or self.nprobe, ef_search or self.ef_search, rescore_factor=self.rescore_factor)
+            return search_with_params(self.vector_store, vector, k=k, params=params)
+    
+    def list_values(self, field: str = "source") -> List:
+        if self.vector_store is None:
+            return []
+        with self.index_lock.read():
+            return self.partitions.values(self.vector_store, field)
     
     def save(self, index_name: str = "faiss_index"):
         if self.vector_store is None:
             raise ValueError("No vector store to save")
         index_path = os.path.join(self.persist_directory, index_name)
-        self.vector_store.save_local(index_path)
+        with span("index.save"), self.write_lock:
+            if isinstance(self.vector_store, MmapVectorStore):
+                return
+            save_faiss_store(self.vector_store, index_path)
+            self.chunk_tracker.save(os.path.join(index_path, "chunk_map.json"))
+            if self._pending_bm25 is None:
+                self.bm25_index.save(os.path.join(index_path, "bm25.json"))
+            if self.use_mmap:
+                write_mmap_store(self.vector_store, os.path.join(index_path, "mmap"))
     
     def load(self, index_name: str = "faiss_index") -> FAISS:
         index_path = os.path.join(self.persist_directory, index_name)
         if not os.path.exists(index_path):
             raise FileNotFoundError(f"No saved index found at {index_path}")
-        self.vector_store = FAISS.load_local(
-            index_path, 
-            self.embeddings,
-            allow_dangerous_deserialization=True
-        )
-        return self.vector_store
+        mmap_path = os.path.join(index_path, "mmap")
+        chunk_map_path = os.path.join(index_path, "chunk_map.json")
+        if self.use_mmap and MmapVectorStore.exists(mmap_path):
+            vector_store = MmapVectorStore(mmap_path, self.embeddings)
+            self._swap_store(vector_store, os.path.join(index_path, "bm25.json"), chunk_map_path)
+            return vector_store
+        vector_store = load_faiss_store(index_path, self.embeddings)
+        if vector_store is None:
+            vector_store = FAISS.load_local(
+                index_path, 
+                self.embeddings,
+                allow_dangerous_deserialization=True
+            )
+            vector_store.docstore = as_chunk_store(vector_store.docstore)
+        self._swap_store(vector_store, os.path.join(index_path, "bm25.json"))
+        if not self.chunk_tracker.load(chunk_map_path):
+            self.chunk_tracker.rebuild_from_store(vector_store)
+        if self.use_mmap:
+            write_mmap_store(vector_store, mmap_path)
+        return vector_store
+    
+    def _swap_store(self, vector_store, bm25_path: str, chunk_map_path: Optional[str] = None):
+        with self.index_lock.write():
+            self.vector_store = vector_store
+            self._pending_chunk_map = chunk_map_path
+            self.bm25_index.reset()
+            self._pending_bm25 = bm25_path
+    
+    def get_stats(self, evaluate_recall: bool = False, recall_queries: int = 50, recall_k: int = 10) -> dict:
+        with self.index_lock.read():
+            return self._index_stats(evaluate_recall, recall_queries, recall_k)
     
-    def get_stats(self) -> dict:
+    def _index_stats(self, evaluate_recall: bool, recall_queries: int, recall_k: int) -> dict:
         if self.vector_store is None:
             return {"status": "not_initialized"}
-        return {
+        stats = {
             "status": "initialized",
             "num_vectors": self.vector_store.index.ntotal,
-            "dimension": self.vector_store.index.d
+            "dimension": self.vector_store.index.d,
+            "index_type": describe_index(self.vector_store.index),
+            "quantization": quantization_mode(self.vector_store.index),
+            "quantized_memory": quantized_memory_bytes(self.vector_store.index) or None,
+            "index_bytes": self.vector_store.index_bytes() if isinstance(self.vector_store, MmapVectorStore) else index_memory_bytes(self.vector_store.index),
+            "storage": "mmap" if isinstance(self.vector_store, MmapVectorStore) else "memory",
+            "search_mode": self.search_mode,
+            "bm25_terms": len(self.bm25_index.postings) if self._pending_bm25 is None else None,
+            "chunk_store_bytes": self.vector_store.docstore.memory_bytes() if isinstance(self.vector_store.docstore, ChunkStore) else None,
+            "search_params": {"nprobe": self.nprobe, "ef_search": self.ef_search},
+            "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else None
         }
+        if evaluate_recall:
+            params = search_parameters(self.vector_store.index, self.nprobe, self.ef_search, rescore_factor=self.rescore_factor)
+            stats["recall"] = measure_recall(self.vector_store, num_queries=recall_queries, k=recall_k, params=params)
+        return stats
 
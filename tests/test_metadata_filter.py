@@ -0,0 +1,37 @@
+import pytest
+from langchain_core.documents import Document
+from src.benchmark import HashingEmbeddings
+from src.vector_store import VectorStoreManager
+
+
+def build_manager(tmp_path, index_type, index_params):
+    manager = VectorStoreManager(
+        openai_api_key="unused",
+        persist_directory=str(tmp_path),
+        embeddings=HashingEmbeddings(),
+        use_embedding_cache=False,
+        index_type=index_type,
+        index_params=index_params
+    )
+    documents = [
+        Document(page_content=f"{source} report section {i} covers topic {i % 7}", metadata={"source": source})
+        for source in ("alpha.txt", "beta.txt", "gamma.txt")
+        for i in range(150)
+    ]
+    manager.create_vector_store(documents)
+    return manager
+
+
+@pytest.mark.parametrize("index_type, index_params", [
+    ("ivf_flat", {"nlist": 8}),
+    ("ivf_pq", {"nlist": 8, "pq_m": 8, "pq_bits": 4})
+])
+def test_filtered_search_on_ivf_uses_default_nprobe(tmp_path, index_type, index_params):
+    manager = build_manager(tmp_path, index_type, index_params)
+    assert manager.nprobe is None
+
+    results = manager.similarity_search("report section covers topic 3", k=5, filter={"source": "beta.txt"})
+
+    assert results
+    assert {doc.metadata["source"] for doc, _ in results} == {"beta.txt"}
+